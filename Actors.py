@@ -5,15 +5,20 @@ from Components.GeneralComponents import *
 
 
 class Wario(GameActor):
+	# The camera follows Wario, so he's always active:
+	always_active = True
+
 	def __init__(self, position, engine_wrapper):
 		GameActor.__init__(self, position, engine_wrapper)
 		self.rect.size = (20, 30)
 		self.components = [GravityComponent(),
 						wc.StatesComponent(),
-						wc.LookComponent(),
+						wc.LookComponent(engine_wrapper),
 						wc.MoveComponent(),
 						GeneralCollisionComponent(),
 						ApplyVelocityComponent()]
+		# The camera follows Wario:
+		self.engine.graphics.set_camera_focus(self)
 
 
 class SpearHead(GameActor):
@@ -22,7 +27,7 @@ class SpearHead(GameActor):
 		self.rect.size = (20, 16)
 		self.components = [GravityComponent(),
 						   spc.StateComponent(),
-						   spc.LookComponent(),
+						   spc.LookComponent(engine_wrapper),
 						   spc.MoveComponent(),
 						   GeneralCollisionComponent(),
 						   ApplyVelocityComponent()]
\ No newline at end of file
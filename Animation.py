@@ -1,6 +1,93 @@
+from bisect import bisect_right
+
 from globals import pygame
 
 
+class AnimationClip(object):
+	"""
+	The part of an animation that never changes: the frames and how long each of them is shown.
+	Clips are shared by all animations using the same sprites in the same order (see AssetCache.get_clip()),
+	so e.g. fifty spearheads only have one set of frames. The state of an animation (current frame, paused...)
+	is kept by Animation.
+
+	The frames are packed into a texture atlas (see Atlas), and referenced as (page, area). The atlas and the shared
+	clips belong to the AssetCache of the engine, which forgets them when another level is started.
+	"""
+
+	def __init__(self, sprites, sprite_order, atlas, colorkey=None):
+		"""
+		See Animation for the arguments. Use AssetCache.get_clip() to reuse existing clips.
+		:param atlas: The Atlas the frames are packed into
+		:param colorkey: If given, the pixels of this color are transparent, see Animation.set_colorkey()
+		"""
+		self.atlas = atlas
+		self.colorkey = colorkey
+		# Save the sprites, this also keeps their ids unique as long as the clip exists:
+		self.sprites = tuple(sprites)
+		# The order of the sprites as tuple of (sprite_nr, frame_length):
+		self.sprite_order = self.format_sprite_order(sprite_order, len(self.sprites))
+		# The frame_length of every step, so the animation doesn't have to unpack the tuples:
+		self.durations = tuple(length for sprite, length in self.sprite_order)
+		# Cumulative frame-table: The frame every step ends on, counted from the start of the animation:
+		self.timeline = tuple(sum(self.durations[:step+1]) for step in range(len(self.durations)))
+		self.length = self.timeline[-1]
+
+		# The (page, area) of every step in the atlas. The sprites are drawn onto a surface with the colorkey
+		# (255, 0, 255) once, instead of every time an animation shows another sprite, and then packed:
+		frames = {}
+		for sprite, length in self.sprite_order:
+			if sprite not in frames:
+				surface = pygame.Surface(self.sprites[sprite].get_size())
+				if colorkey is None:
+					surface.fill((225, 0, 225))
+					surface.blit(self.sprites[sprite], (0, 0))
+				else:
+					# The pixels of the colorkey aren't drawn, so they keep the colorkey of the atlas:
+					keyed_sprite = self.sprites[sprite].copy()
+					keyed_sprite.set_colorkey(colorkey)
+					surface.fill((255, 0, 255))
+					surface.blit(keyed_sprite, (0, 0))
+				surface.set_colorkey((255, 0, 255))
+				frames[sprite] = self.atlas.add(surface)
+		self.frames = tuple(frames[sprite] for sprite, length in self.sprite_order)
+		# Surfaces of single frames, only created if someone needs them, see self.get_surface():
+		self._surfaces = {}
+
+		# The mirrored clips, created when they're needed first, see AssetCache.get_mirrored_clip():
+		self.mirrors = {}
+
+	@staticmethod
+	def format_sprite_order(sprite_order, sprite_amount):
+		"""
+		Converts every kind of sprite_order (see Animation) into a tuple of (sprite_nr, frame_length).
+		"""
+		if type(sprite_order) in (list, tuple):
+			if type(sprite_order[0]) is tuple:
+				# sprite_order is already formatted:
+				return tuple(sprite_order)
+			else:
+				# sprite_order consists of amounts of frames for sprites:
+				return tuple((sprite, length) for sprite, length in zip(range(sprite_amount), sprite_order))
+		else:
+			# sprite_order consists of one amount of frames for every sprite:
+			return tuple((sprite, sprite_order) for sprite in range(sprite_amount))
+
+	def get_step_at(self, frame):
+		"""
+		Returns the index of the step shown a number of frames after the start of the animation (it loops).
+		"""
+		return bisect_right(self.timeline, frame % self.length)
+
+	def get_surface(self, step):
+		"""
+		Returns the frame of a step as surface of its own. It shares its pixels with the atlas.
+		"""
+		if step not in self._surfaces:
+			page, area = self.frames[step]
+			self._surfaces[step] = page.subsurface(area)
+		return self._surfaces[step]
+
+
 class Animation:
 	"""
 	The animation class is very useful to handle sprite-animations.
@@ -10,8 +97,10 @@ class Animation:
 	Most methods who aren't getters return self in order to perform actions like
 	animation.pause().reset().get_surface()
 
+	An animation only stores which frame is shown, the frames themselves are stored in an AnimationClip,
+	which is shared with every other animation of the same sprites.
 	"""
-	def __init__(self, sprites, sprite_order):
+	def __init__(self, sprites, sprite_order, assets):
 		"""
 		sprites: A list of images of the sprite, each image is a frame of the animation.
 			The images all have to have the same size.
@@ -37,15 +126,15 @@ class Animation:
 			(sprite_nr, frame_length)...].
 			An animation with three different sprites can be 5 sprites long,
 			playing sprite |: 1, 2, 1, 3, 2 :| for 100 frames per sprite for instance would be expressed as follows:
-			Animation([surface_1, surface_2, surface_3], [(1, 100), (2, 100), (1, 100), (3, 100), (1, 100)])
-		"""
+			Animation([surface_1, surface_2, surface_3], [(1, 100), (2, 100), (1, 100), (3, 100), (1, 100)], engine.assets)
 
-		# Save the sprites-list
-		self.sprites = sprites
+		assets: The AssetCache of the engine, which shares the clips (see AnimationClip)
+		"""
 
-		# Save the speed and order of sprites according to the type of the given list:
-		self.sprite_order = sprite_order
-		self.format_sprite_order()
+		# The AssetCache of the engine, it keeps the clips:
+		self.assets = assets
+		# Get the clip of the sprites, all animations with the same sprites and sprite_order share it:
+		self.clip = assets.get_clip(sprites, sprite_order)
 
 		# Initialize the frame_counter
 		self.frame_counter = 0
@@ -53,25 +142,20 @@ class Animation:
 		# Initialize the var holding the index of the current sprite
 		self.current_sprite = 0
 
-		# Create the surface the current frame will be blitted on
-		self.surface = pygame.Surface(self.sprites[0].get_size())
-
-		# Set the colorkey (225, 0, 255)
-		self.surface.set_colorkey((255, 0, 255))
-
-		# Blit the image of the current frame onto the surface
-		self.surface.blit(self.sprites[0], (0, 0))
-		
-		# Create an empty surface to clean the main surface up after updating
-		self.empty_surface = pygame.Surface(self.sprites[0].get_size())
-		self.empty_surface.fill((225, 0, 225))
-
 		# Pause the animation
 		self.playb = True
 
 		# Create the reference to the own animation
 		self.copy = Animation
 
+	@property
+	def sprites(self):
+		return self.clip.sprites
+
+	@property
+	def sprite_order(self):
+		return self.clip.sprite_order
+
 	def play(self):
 		"""
 		Plays the animation, meaning surface and frame-number get updated over time
@@ -93,10 +177,17 @@ class Animation:
 		"""
 		# Sets the current sprite to 0:
 		self.current_sprite = 0
-		# Makes the surface empty:
-		self.surface.blit(self.empty_surface, (0, 0))
-		# Blit the image of the new frame onto the surface
-		self.surface.blit(self.sprites[self.sprite_order[self.current_sprite][0]], (0, 0))
+		return self
+
+	def seek(self, frame):
+		"""
+		Shows the sprite shown a number of frames after the start of the animation, e.g. to keep multiple
+		animations in sync with one clock (see World).
+		"""
+		self.current_sprite = self.clip.get_step_at(frame)
+		# Count the frames the current sprite is already shown:
+		self.frame_counter = frame % self.clip.length - (self.clip.timeline[self.current_sprite] -
+														 self.clip.durations[self.current_sprite])
 		return self
 
 	def set_spritenr(self, nr):
@@ -111,20 +202,16 @@ class Animation:
 		With this function, the speed of the animation can be changed.
 		The speed is frames per image, so the framerate is 1/speed.
 		"""
-		# Update the animation-speed:
-		self.sprite_order = frames_per_image
-
-		# Make sure self.sprite_order is a list containing the speed for every frame, (convert int to list)
-		self.format_sprite_order()
-
+		# Use the clip with the new speed:
+		self.clip = self.assets.get_clip(self.clip.sprites, frames_per_image, self.clip.colorkey)
 		return self
 
 	def set_colorkey(self, color):
 		"""
-		Sets the colorkey of all sprites.
+		Makes the pixels of a color transparent in every frame. The frames in the atlas are shared, so the animation
+		gets the clip of its sprites with this colorkey instead of changing them.
 		"""
-		for sprite in self.sprites:
-			sprite.set_colorkey(color)
+		self.clip = self.assets.get_clip(self.clip.sprites, self.clip.sprite_order, color)
 		return self
 
 	def _custom(self):
@@ -134,19 +221,6 @@ class Animation:
 		"""
 		pass
 
-	def format_sprite_order(self):
-		if type(self.sprite_order) is list:
-			if type(self.sprite_order[0]) is tuple:
-				# sprite_order is already formatted:
-				self.sprite_order = self.sprite_order
-			else:
-				# sprite_order consists of amounts of frames for sprites:
-				self.sprite_order = \
-					[(sprite, length) for sprite, length in zip(range(len(self.sprites)), self.sprite_order)]
-		else:
-			# sprite_order consists of one amount of frames for every sprite:
-			self.sprite_order = [(sprite, self.sprite_order) for sprite in range(len(self.sprites))]
-
 	def update(self):
 		"""
 		This method must be called every frame.
@@ -154,23 +228,17 @@ class Animation:
 		"""
 		# Execute the custom update method used by inherited classes:
 		self._custom()
-		# Make sure frames_per_image is a list:
-		self.format_sprite_order()
 		# If animation is currently playing, increase frame_counter
 		if self.playb:
 			self.frame_counter += 1
 
 		# If the current frame-number exceeds the speed frames_per_image...
-		if self.frame_counter >= self.sprite_order[self.current_sprite][1]:
+		if self.frame_counter >= self.clip.durations[self.current_sprite]:
 			# Increase the index of the current sprite
 			self.current_sprite += 1
 			# If the index of the current frame is higher than the length of sprites available, reset it to 0
-			if self.current_sprite >= len(self.sprite_order):
+			if self.current_sprite >= len(self.clip.durations):
 				self.current_sprite = 0
-			# Clean up the surface
-			self.surface.blit(self.empty_surface, (0, 0))
-			# Blit the image of the new frame onto the surface
-			self.surface.blit(self.sprites[self.sprite_order[self.current_sprite][0]], (0, 0))
 			# Reset the frame_counter
 			self.frame_counter = 0
 		return self
@@ -182,35 +250,54 @@ class Animation:
 		return self.current_sprite
 
 	def get_animation_length(self):
-		return len(self.sprite_order)
+		return len(self.clip.sprite_order)
+
+	def get_frame(self):
+		"""
+		Returns the current frame as (page, area) of the atlas, blit it with graphics.blit(page, position, area).
+		It's shared with other animations, so it must not be changed.
+		"""
+		return self.clip.frames[self.current_sprite]
+
+	def get_rect(self, **kwargs):
+		"""
+		Returns the rect of the current frame, positioned like Surface.get_rect(), e.g. get_rect(midbottom=(x, y)).
+		"""
+		rect = pygame.Rect((0, 0), self.clip.frames[self.current_sprite][1].size)
+		for name, value in kwargs.items():
+			setattr(rect, name, value)
+		return rect
 
 	def get_surface(self):
 		"""
-		Returns the current surface.
+		Returns the current surface. Slower than get_frame(), and it shares its pixels with the atlas,
+		so it must not be changed either.
 		"""
-		return self.surface
+		return self.clip.get_surface(self.current_sprite)
+
+	def _make_mirror(self, flip_x, flip_y):
+		# Create a new animation, but with the mirrored clip:
+		mirror = self.copy(self.clip.sprites, self.clip.sprite_order, self.assets)
+		mirror.clip = self.assets.get_mirrored_clip(self.clip, flip_x, flip_y)
+		return mirror
 
 	def make_x_mirror(self):
 		"""
 		Mirrors every image of the animation on the x axis.
 		Useful for e.g. walk- or jump-animations.
 		"""
-		new_sprites = [pygame.transform.flip(surf, 1, 0) for surf in self.sprites]
-		return self.copy(new_sprites, self.sprite_order)
+		return self._make_mirror(True, False)
 
 	def make_y_mirror(self):
 		"""
 		Mirrors every image of the animation on the y axis.
 		Useful for e.g. walk- or jump-animations.
 		"""
-		new_sprites = [pygame.transform.flip(surf, 0, 1) for surf in self.sprites]
-		return self.copy(new_sprites, self.sprite_order)
+		return self._make_mirror(False, True)
 
 	def make_xy_mirror(self):
 		"""
 		Mirrors every image of the animation on the x- and the y-axis.
 		Useful for e.g. walk- or jump-animations.
 		"""
-
-		new_sprites = [pygame.transform.flip(surf, 1, 1) for surf in self.sprites]
-		return self.copy(new_sprites, self.sprite_order)
\ No newline at end of file
+		return self._make_mirror(True, True)
@@ -0,0 +1,137 @@
+import threading
+
+from globals import pygame
+from EngineController import *
+from Animation import *
+from Atlas import *
+import utilities
+
+
+class ClipCache(object):
+	"""
+	The AnimationClips of one level and the Atlas their frames are packed into, see AssetCache.get_clip().
+	Every level gets its own, so the frames of a level are freed together with it.
+	"""
+
+	def __init__(self):
+		# The clips, by the ids of their sprites, their sprite_order and their colorkey:
+		self.clips = {}
+		self.atlas = Atlas()
+
+
+class AssetCache(EngineController):
+	"""
+	Loads images only once and shares them between everyone using them, e.g. all spearheads.
+	Images are cached by path, tile-size, flipping, colorkey and whether they have an alpha-channel.
+
+	The returned frames are tuples and must not be changed, since they're shared. Every user has to keep its own
+	state (like the current frame, see Animation) itself.
+
+	It also keeps the AnimationClips and the Atlas their frames are packed into (see ClipCache). They're only needed
+	by the current level: A world is built with a ClipCache of its own (see self.set_thread_clips()), which replaces
+	the current one when its level is started (see Engine._set_level()).
+	"""
+
+	def __init__(self, engine):
+		super(AssetCache, self).__init__(engine)
+		self._frames = {}
+		# The ClipCache of the current level:
+		self.clips = ClipCache()
+		# The ClipCache of the world built by a thread, if it isn't the current one, see self.set_thread_clips():
+		self._thread_clips = threading.local()
+		# Levels are also loaded in other threads, see Engine.preload_level(). The lock guards every clip and every
+		# write to an atlas:
+		self._lock = threading.RLock()
+
+	def get_frames(self, path, tile_size=None, flip_x=False, flip_y=False, colorkey=None, alpha=True):
+		"""
+		Returns the frames of an image.
+		:param path: The path of the image
+		:param tile_size: If given, the image is split into tiles of this size (see utilities.split_tiled_image()),
+			otherwise the image is the only frame
+		:param flip_x: True if the frames should be mirrored on the x axis
+		:param flip_y: True if the frames should be mirrored on the y axis
+		:param colorkey: Colorkey of the tiles, only used if tile_size is given
+		:param alpha: True to keep the alpha-channel of the image (convert_alpha()), False to drop it (convert())
+		:return: Tuple of surfaces
+		"""
+		key = (path, tile_size, flip_x, flip_y, colorkey, alpha)
+		with self._lock:
+			if key not in self._frames:
+				if flip_x or flip_y:
+					# Mirror the unmirrored frames:
+					frames = tuple(pygame.transform.flip(frame, flip_x, flip_y)
+								   for frame in self.get_frames(path, tile_size, colorkey=colorkey, alpha=alpha))
+				else:
+					image = pygame.image.load(path)
+					image = image.convert_alpha() if alpha else image.convert()
+					frames = tuple(utilities.split_tiled_image(image, tile_size, colorkey)) if tile_size else (image,)
+				self._frames[key] = frames
+			return self._frames[key]
+
+	def get_clip(self, sprites, sprite_order, colorkey=None):
+		"""
+		Returns the AnimationClip of these sprites, this sprite_order and this colorkey, it is only created once.
+		:param sprites: The frames of the animation, see Animation
+		:param sprite_order: The order of the frames, see Animation
+		:param colorkey: Color of the pixels that are transparent, see Animation.set_colorkey()
+		:return: The AnimationClip
+		"""
+		sprite_order = AnimationClip.format_sprite_order(sprite_order, len(sprites))
+		key = (tuple(id(sprite) for sprite in sprites), sprite_order, None if colorkey is None else tuple(colorkey))
+		with self._lock:
+			clip_cache = self._get_clip_cache()
+			if key not in clip_cache.clips:
+				clip_cache.clips[key] = AnimationClip(sprites, sprite_order, clip_cache.atlas, colorkey)
+			return clip_cache.clips[key]
+
+	def get_mirrored_clip(self, clip, flip_x, flip_y):
+		"""
+		Returns an AnimationClip with every sprite of a clip mirrored. Mirrored clips are only created once.
+		They're packed into the atlas under the same lock as every other clip, since worlds are also built in other
+		threads (see Engine.preload_level()).
+		:param clip: The AnimationClip
+		:param flip_x: True to mirror the sprites on the x axis
+		:param flip_y: True to mirror the sprites on the y axis
+		:return: The mirrored AnimationClip
+		"""
+		with self._lock:
+			if (flip_x, flip_y) not in clip.mirrors:
+				sprites = [pygame.transform.flip(sprite, flip_x, flip_y) for sprite in clip.sprites]
+				clip.mirrors[(flip_x, flip_y)] = AnimationClip(sprites, clip.sprite_order, self._get_clip_cache().atlas,
+															   clip.colorkey)
+			return clip.mirrors[(flip_x, flip_y)]
+
+	def _get_clip_cache(self):
+		"""
+		Returns the ClipCache new clips of this thread go into.
+		"""
+		clip_cache = getattr(self._thread_clips, "clips", None)
+		return self.clips if clip_cache is None else clip_cache
+
+	def set_thread_clips(self, clip_cache):
+		"""
+		Makes the clips created by this thread go into a ClipCache other than the current one, e.g. while the world
+		of another level is built.
+		:param clip_cache: The ClipCache, None to use the current one again
+		:return: None
+		"""
+		self._thread_clips.clips = clip_cache
+
+	def set_clips(self, clip_cache):
+		"""
+		Replaces the ClipCache of the current level. Animations that still exist keep their clips and frames, they're
+		freed together with the last animation using them.
+		:param clip_cache: The ClipCache of the new level
+		:return: None
+		"""
+		with self._lock:
+			self.clips = clip_cache
+
+	def clear(self):
+		"""
+		Forgets every cached image and every clip.
+		"""
+		with self._lock:
+			self._frames = {}
+			self.clips = ClipCache()
@@ -0,0 +1,74 @@
+from globals import pygame
+
+
+class Atlas(object):
+	"""
+	Packs lots of small surfaces (like the frames of animations or tiles) into a few big surfaces, the pages.
+	A packed surface is referenced as (page, area), which can be blitted directly, e.g. with
+	graphics.blit(page, position, area). This saves the overhead of thousands of small surfaces.
+
+	The pages are packed in shelves: Surfaces are put next to each other in rows, and a new row is started below
+	the last one if a surface doesn't fit into any row anymore. A new page is created when the last one is full.
+	The pages are filled with the colorkey, so everything that isn't drawn on stays transparent.
+	"""
+
+	def __init__(self, page_size=(1024, 1024), colorkey=(255, 0, 255)):
+		self.page_size = page_size
+		self.colorkey = colorkey
+		self.pages = []  # The big surfaces
+		self._shelves = []  # The rows of the last page, as [top, height, used width]
+
+	def _add_page(self):
+		"""
+		Adds an empty page.
+		"""
+		page = pygame.Surface(self.page_size)
+		# Use the format of the screen, so blitting doesn't have to convert anything:
+		if pygame.display.get_surface() is not None:
+			page = page.convert()
+		page.fill(self.colorkey)
+		page.set_colorkey(self.colorkey)
+		self.pages.append(page)
+		self._shelves = []
+
+	def _find_space(self, size):
+		"""
+		Returns the position of a free area of this size on the last page, or None if it's full.
+		"""
+		for shelf in self._shelves:
+			# Use the first row that's high enough and has enough space left:
+			if shelf[1] >= size[1] and self.page_size[0] - shelf[2] >= size[0]:
+				shelf[2] += size[0]
+				return shelf[2] - size[0], shelf[0]
+		# Start a new row below the last one:
+		top = self._shelves[-1][0] + self._shelves[-1][1] if self._shelves else 0
+		if top + size[1] <= self.page_size[1]:
+			self._shelves.append([top, size[1], size[0]])
+			return 0, top
+		return None
+
+	def add(self, surface):
+		"""
+		Packs a surface. Transparent parts of it (its colorkey or alpha) stay transparent.
+		:param surface: The surface, not bigger than a page
+		:return: (page, area) - the page the surface was drawn on and the rect it was drawn in
+		"""
+		size = surface.get_size()
+		assert size[0] <= self.page_size[0] and size[1] <= self.page_size[1], \
+			"Surface of size %s doesn't fit into the atlas." % (size,)
+
+		position = self._find_space(size) if self.pages else None
+		# If the last page is full, use a new one:
+		if position is None:
+			self._add_page()
+			position = self._find_space(size)
+
+		area = pygame.Rect(position, size)
+		self.pages[-1].blit(surface, area)
+		return self.pages[-1], area
+
+	def get_page_amount(self):
+		"""
+		Returns the amount of pages.
+		"""
+		return len(self.pages)
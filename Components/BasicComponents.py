@@ -14,7 +14,13 @@ class GameActorComponent(object):
 	or move relative to the keys pressed by the user.
 
 	Everything they need they store themselves - if they need to communicate with each other, they can either
-	send a message using game_actor.send((name, value)) or receive a message using self.recieve_message(message)."""
+	send a message using game_actor.send((name, value)) or receive a message using self.recieve_message(message).
+
+	Components only receive the messages listed in handled_messages (see GameActor.send_message()). Classes that
+	override receive_message() have to update it, None means every message."""
+
+	# The names (MSGN) of the messages receive_message() does something with, None for all messages:
+	handled_messages = None
 
 	def update(self, game_actor, engine):
 		"""
@@ -24,6 +30,16 @@ class GameActorComponent(object):
 		"""
 		pass
 
+	def draw(self, game_actor, engine):
+		"""
+		Draws the game actor, called once per rendered frame after every game actor was updated.
+		Might be called less or more often than update(), so it must not change anything.
+		Args:
+			engine: The engine singleton. Use to interact with the engine (e.g. engine.graphics, engine.world etc..)
+			game_actor: The game actor this component is supposed to draw
+		"""
+		pass
+
 	def receive_message(self, name, value):
 		"""Recieve a message (a touple: (name, value)) from other components."""
 		pass
@@ -33,6 +49,8 @@ class VelocityComponent(GameActorComponent):
 	"""
 	Can be used for inheritance for components that only listen to the message "velocity".
 	"""
+	handled_messages = (MSGN.VELOCITY,)
+
 	def __init__(self):
 		self.velocity = [0, 0]
 
@@ -42,6 +60,8 @@ class VelocityComponent(GameActorComponent):
 
 
 class StatesComponent(GameActorComponent):
+	handled_messages = (MSGN.STATE, MSGN.LOOKDIRECTION, MSGN.COLLISION_SIDES)
+
 	def __init__(self):
 		self.colliding_sides = []
 		self.state = WarioStates.UPRIGHT_STAY
@@ -1,6 +1,8 @@
 from .BasicComponents import *
 from .locals import *
 
+from Materials import *
+
 
 class GeneralCollisionComponent(VelocityComponent):
 	"""
@@ -11,11 +13,17 @@ class GeneralCollisionComponent(VelocityComponent):
 	-shot-break
 	-fire-break
 	"""
+	def __init__(self):
+		super(GeneralCollisionComponent, self).__init__()
+		# Debug: Rects and text drawn by self.draw(), as (rect, color, rect-number or None):
+		self.debug_rects = []
+
 	def update(self, game_actor, engine):
 		# Debug: Draw rects and text..
 		debug_draw_rects = False
 		# Debug: Draw rect-number
 		debug_rect_nr = 0
+		self.debug_rects = []
 		# Clear the list which stores what sides are colliding:
 		colliding_sides_list = []
 		game_actor.send_message(MSGN.COLLISION_SIDES, colliding_sides_list)
@@ -24,7 +32,7 @@ class GeneralCollisionComponent(VelocityComponent):
 		# Move the copy with velocity, so we can see how the rect would look like after applied velocity:
 		rect_copy.move_ip(self.velocity)
 		# Colliding materials:
-		colliding_mats = ["solid", "soft-break", "hard-break", "shot-break", "fire-break"]
+		colliding_mats = Materials.COLLIDING
 		# Get a colliding rect:
 		colliding_rects = engine.world.get_colliding_rects(Layers.main, colliding_mats, rect_copy)
 		# Create a velocity_multiplier with which the velocity will be multiplied in the end
@@ -61,36 +69,36 @@ class GeneralCollisionComponent(VelocityComponent):
 					colliding_side = TOP
 
 			# Debugging:
-			if debug_draw_rects: engine.graphics.draw_rect(colliding_rect, (43, 192, 225), 2)
+			if debug_draw_rects: self.debug_rects.append((colliding_rect, (43, 192, 225), None))
 			# Now determine if another rect is on the side game_actor is colliding with, and if it is, ignore the collision
 
 			# TODO: Somehow make this four very similar looking cases simpler
 			if colliding_side == TOP:
 				# If tile on bottom of the tile isn't in the checked material-groups:
-				if engine.world.get_tile_relative_to("main", colliding_rect, (0, 1)).get_material_group() not in colliding_mats:
+				if not engine.world.get_tile_relative_to("main", colliding_rect, (0, 1)).get_material_mask() & colliding_mats:
 					velocity_multiplier[1] = 0
 					# Debug:
 					if debug_draw_rects:
-						self.draw_debug(engine, colliding_rect, debug_rect_nr)
+						self.debug_rects.append((colliding_rect, (225, 0, 0), debug_rect_nr))
 					# Append side of collision
 					colliding_sides_list.append(colliding_side)
 			elif colliding_side == BOTTOM:
-				if engine.world.get_tile_relative_to("main", colliding_rect, (0, -1)).get_material_group() not in colliding_mats:
+				if not engine.world.get_tile_relative_to("main", colliding_rect, (0, -1)).get_material_mask() & colliding_mats:
 					velocity_multiplier[1] = 0
 					if debug_draw_rects:
-						self.draw_debug(engine, colliding_rect, debug_rect_nr)
+						self.debug_rects.append((colliding_rect, (225, 0, 0), debug_rect_nr))
 					colliding_sides_list.append(colliding_side)
 			elif colliding_side == RIGHT:
-				if engine.world.get_tile_relative_to("main", colliding_rect, (-1, 0)).get_material_group() not in colliding_mats:
+				if not engine.world.get_tile_relative_to("main", colliding_rect, (-1, 0)).get_material_mask() & colliding_mats:
 					velocity_multiplier[0] = 0
 					if debug_draw_rects:
-						self.draw_debug(engine, colliding_rect, debug_rect_nr)
+						self.debug_rects.append((colliding_rect, (225, 0, 0), debug_rect_nr))
 					colliding_sides_list.append(colliding_side)
 			elif colliding_side == LEFT:
-				if engine.world.get_tile_relative_to("main", colliding_rect, (1, 0)).get_material_group() not in colliding_mats:
+				if not engine.world.get_tile_relative_to("main", colliding_rect, (1, 0)).get_material_mask() & colliding_mats:
 					velocity_multiplier[0] = 0
 					if debug_draw_rects:
-						self.draw_debug(engine, colliding_rect, debug_rect_nr)
+						self.debug_rects.append((colliding_rect, (225, 0, 0), debug_rect_nr))
 					colliding_sides_list.append(colliding_side)
 			debug_rect_nr += 1
 
@@ -101,10 +109,14 @@ class GeneralCollisionComponent(VelocityComponent):
 		# Send the colliding sides to the components:
 		game_actor.send_message(MSGN.COLLISION_SIDES, colliding_sides_list)
 
-	@staticmethod
-	def draw_debug(engine, colliding_rect, rect_nr):
-		engine.graphics.draw_rect(colliding_rect, (225, 0, 0), 1)
-		engine.graphics.draw_text(rect_nr, colliding_rect.topleft, (225, 225, 225))
+	def draw(self, game_actor, engine):
+		# Debug: Draw the rects of the last update:
+		for colliding_rect, color, rect_nr in self.debug_rects:
+			if rect_nr is None:
+				engine.graphics.draw_rect(colliding_rect, color, 2)
+			else:
+				engine.graphics.draw_rect(colliding_rect, color, 1)
+				engine.graphics.draw_text(rect_nr, engine.graphics.world_to_screen(colliding_rect.topleft), (225, 225, 225))
 
 	@staticmethod
 	def get_collision_vector(static_rect, mov_rect, mov_vel):
@@ -120,16 +132,39 @@ class GravityComponent(VelocityComponent):
 	"""
 	Adds gravity to the velocity vector. Simple as that.
 	self.g = acceleration, self.max_fall_speed = - the maximum fall speed!
+	If the batched physics is enabled (see Physics.PhysicsSystem), it adds the gravity of all game-actors at once.
 	"""
 	def __init__(self):
 		VelocityComponent.__init__(self)
 		self.g = 1
 		self.max_fall_speed = 2
+		# Batched physics: The physics-system and the row of its arrays, once registered:
+		self.physics = None
+		self.physics_row = None
+
+	def receive_message(self, name, value):
+		super(GravityComponent, self).receive_message(name, value)
+		# Keep the velocity of the batched physics up to date:
+		if name == MSGN.VELOCITY and self.physics_row is not None:
+			self.physics.set_fall_speed(self.physics_row, self.velocity[1])
 
 	def update(self, game_actor, engine):
+		if engine.physics.enabled:
+			# The gravity was already added, only send it:
+			if self.physics_row is not None:
+				fall_speed = engine.physics.get_acceleration(self.physics_row)
+				if fall_speed is not None:
+					self.velocity = self.velocity[0], fall_speed
+					game_actor.send_message(MSGN.VELOCITY, self.velocity)
+				return
+			# From the next frame on, the batched physics adds the gravity:
+			self.physics = engine.physics
+			self.physics.add_gravity(game_actor, self)
 		if self.velocity[1] <= self.max_fall_speed:
 			self.velocity = self.velocity[0], self.velocity[1] + self.g
 			game_actor.send_message(MSGN.VELOCITY, self.velocity)
+			if self.physics_row is not None:
+				self.physics.set_fall_speed(self.physics_row, self.velocity[1])
 
 
 class ApplyVelocityComponent(VelocityComponent):
@@ -138,6 +173,8 @@ class ApplyVelocityComponent(VelocityComponent):
 	Since pygame-rects can only move full numbers (integers to be precise - fractions always get rounded downwards)
 	the movement for e.g. 1.5 pixel per second mast me calculated separately in order to keep the .5 pixels in the movement.
 	Further details are in the update-method.
+	If the batched physics is enabled (see Physics.PhysicsSystem), it moves all game-actors at once, after every
+	game-actor was updated.
 	"""
 	def __init__(self):
 		VelocityComponent.__init__(self)
@@ -145,8 +182,24 @@ class ApplyVelocityComponent(VelocityComponent):
 		self._tmp_velocity_frac = [0, 0]
 		# Create function to get the sign of a number:
 		self.sign = lambda x: 1 if x >= 0 else -1
+		# Batched physics: The physics-system and the row of its arrays, once registered:
+		self.physics = None
+		self.physics_row = None
+
+	def receive_message(self, name, value):
+		super(ApplyVelocityComponent, self).receive_message(name, value)
+		# Keep the velocity of the batched physics up to date:
+		if name == MSGN.VELOCITY and self.physics_row is not None:
+			self.physics.set_velocity(self.physics_row, self.velocity)
 
 	def update(self, game_actor, engine):
+		if engine.physics.enabled:
+			# The batched physics moves the game-actor, starting with this frame:
+			if self.physics_row is None:
+				self.physics = engine.physics
+				self.physics.add_velocity(game_actor, self)
+			return
+
 		# Velocity get copied in order to prevent increase into infinity:
 		tmp_velocity = self.velocity
 
@@ -1,6 +1,8 @@
 from .BasicComponents import *
 from .locals import *
 
+from Materials import *
+
 from os.path import join as j_path
 
 class StateComponent(StatesComponent, VelocityComponent):
@@ -14,7 +16,7 @@ class StateComponent(StatesComponent, VelocityComponent):
 		self.sensor_rect_r = pygame.Rect(1, 1, 10, 10)
 		self.sensor_rect_l = pygame.Rect(1, 1, 10, 10)
 
-		self.colliding_mats = ["solid", "soft-break", "hard-break", "shot-break", "fire-break"]
+		self.colliding_mats = Materials.COLLIDING
 		self.state_stack = [None for i in range(5)]
 
 	def update(self, game_actor, engine):
@@ -48,21 +50,23 @@ class StateComponent(StatesComponent, VelocityComponent):
 
 
 class LookComponent(StatesComponent):
-	def __init__(self):
+	def __init__(self, engine):
 		super(LookComponent, self).__init__()
 
-		# Initialize all Animation objects:
+		# Initialize all Animation objects. The images are shared by all spearheads (see AssetCache):
 		self.animations = {}
-		walk_r_imgs = split_tiled_image(pygame.image.load(j_path("images", "spearhead", "ANI_walk_r.png")).convert_alpha(), (24, 16))
-		self.animations["walk_right"] = Animation(walk_r_imgs, [(2, 15), (0, 15), (1, 15), (0, 15)])
-		self.animations["walk_left"] = self.animations["walk_right"].make_x_mirror()
+		walk_r_path = j_path("images", "spearhead", "ANI_walk_r.png")
+		walk_order = [(2, 15), (0, 15), (1, 15), (0, 15)]
+		self.animations["walk_right"] = Animation(engine.assets.get_frames(walk_r_path, (24, 16)), walk_order, engine.assets)
+		self.animations["walk_left"] = Animation(engine.assets.get_frames(walk_r_path, (24, 16), flip_x=True), walk_order, engine.assets)
 
-		self.animations["stand_right"] = Animation(walk_r_imgs, [0, 600])
-		self.animations["stand_left"] = self.animations["stand_right"].make_x_mirror()
+		self.animations["stand_right"] = Animation(engine.assets.get_frames(walk_r_path, (24, 16)), [0, 600], engine.assets)
+		self.animations["stand_left"] = Animation(engine.assets.get_frames(walk_r_path, (24, 16), flip_x=True), [0, 600], engine.assets)
 
-		turn_imgs = split_tiled_image(pygame.image.load(j_path("images", "spearhead", "ANI_turn_l.png")).convert_alpha(), (24, 16))
-		self.animations["turn_left"] = Animation(turn_imgs, [(0,8), (1, 4), (0, 8), (1, 4), (0, 15), (1, 2), (0, 8), (2, 8), (3, 8), (4, 8), (5, 30), (5, 1)])
-		self.animations["turn_right"] = self.animations["turn_left"].make_x_mirror()
+		turn_l_path = j_path("images", "spearhead", "ANI_turn_l.png")
+		turn_order = [(0,8), (1, 4), (0, 8), (1, 4), (0, 15), (1, 2), (0, 8), (2, 8), (3, 8), (4, 8), (5, 30), (5, 1)]
+		self.animations["turn_left"] = Animation(engine.assets.get_frames(turn_l_path, (24, 16)), turn_order, engine.assets)
+		self.animations["turn_right"] = Animation(engine.assets.get_frames(turn_l_path, (24, 16), flip_x=True), turn_order, engine.assets)
 
 		# Save the current animation
 		self.current_animation = self.animations["stand_right"]
@@ -70,6 +74,8 @@ class LookComponent(StatesComponent):
 		self.current_animation_name = "stand_right"
 		# Play the current animation
 		self.current_animation.play()
+		# The side of the game_actor the image is aligned with, see self.draw():
+		self.align = "bottomleft"
 
 	def receive_message(self, name, value):
 		super(LookComponent, self).receive_message(name, value)
@@ -103,20 +109,22 @@ class LookComponent(StatesComponent):
 
 		# Update the current animation:
 		self.current_animation.update()
-
-		# Calculate the position of the image so its midbottom is aligned with the midbottom of the game_actor
-		if self.look_direction == RIGHT:
-			surface_pos = self.current_animation.get_surface().get_rect(bottomleft = game_actor.rect.bottomleft)
-		else:
-			surface_pos = self.current_animation.get_surface().get_rect(bottomright = game_actor.rect.bottomright)
-
-		# Blit the current sprite to the screen:
-		engine.graphics.blit(self.current_animation.get_surface(), surface_pos)
+		# The image is aligned with the side of the game_actor it looks away from, see self.draw():
+		self.align = "bottomleft" if self.look_direction == RIGHT else "bottomright"
 
 		# Update the other components:
 		game_actor.send_message(MSGN.STATE, self.state)
 		game_actor.send_message(MSGN.LOOKDIRECTION, self.look_direction)
 
+	def draw(self, game_actor, engine):
+		# Calculate the position of the image so it's aligned with the game_actor:
+		surface_pos = self.current_animation.get_rect(**{self.align: getattr(game_actor.rect, self.align)})
+
+		# Blit the current sprite (an area of the atlas) to the screen, if it's visible at all:
+		if engine.graphics.is_visible(surface_pos):
+			page, area = self.current_animation.get_frame()
+			engine.graphics.blit(page, surface_pos, area)
+
 	def play_animation(self, animation_name):
 		"""Plays an animation only if the wanted animation isn't
 		already playing.
@@ -129,6 +137,7 @@ class LookComponent(StatesComponent):
 
 
 class MoveComponent(StatesComponent, VelocityComponent):
+	handled_messages = StatesComponent.handled_messages + (MSGN.VELOCITY,)
 
 	def __init__(self):
 		super(MoveComponent, self).__init__()
@@ -13,6 +13,8 @@ import logging
 
 
 class MoveComponent(StatesComponent, VelocityComponent):
+	handled_messages = StatesComponent.handled_messages + (MSGN.VELOCITY, MSGN.STATESTACK)
+
 	def __init__(self):
 		super(MoveComponent, self).__init__()
 		self.velocity = [0, 0]
@@ -144,7 +146,7 @@ class StatesComponent(StatesComponent):
 				self.state = WarioStates.CROUCH_STAY
 			elif engine.input.keydown_events[self.B]:
 				self.state = WarioStates.SFIST_ONGROUND
-			elif engine.input.keyup_events[self.A]:
+			elif engine.input.keydown_events[self.A]:
 				self.state = WarioStates.JUMP_STAY
 
 			if not BOTTOM in self.colliding_sides:
@@ -245,7 +247,7 @@ class StatesComponent(StatesComponent):
 				self.state = WarioStates.UPRIGHT_STAY
 			elif BOTTOM not in self.colliding_sides:
 				self.state = WarioStates.SFIST_FALL
-			elif engine.input.keyup_events[self.A]:
+			elif engine.input.keydown_events[self.A]:
 				self.state = WarioStates.SFIST_JUMP
 
 		elif self.state == WarioStates.SFIST_JUMP:
@@ -284,6 +286,7 @@ class StatesComponent(StatesComponent):
 		if len(self.state_stack) > self.state_stack_size:
 			self.state_stack.pop(0)
 
+	def draw(self, game_actor, engine):
 		if self.draw_state:
 			engine.graphics.draw_text(self.state, (20, 20), (225, 0, 0))
 
@@ -333,45 +336,30 @@ class StatesComponent(StatesComponent):
 
 
 class LookComponent(StatesComponent):
-	def __init__(self):
+	def __init__(self, engine):
 		super(LookComponent, self).__init__()
 
-		# Initialize all Animation objects:
+		# Initialize all Animation objects. The images are shared (see AssetCache), the mirrored ones as well:
 		self.animations = {}
-		self.animations["stand_right"] = Animation(
-			split_tiled_image(pygame.image.load(j_path("images", "ANI_Wario_stand_r.png")).convert_alpha(),
-							  (20, 29)), [(0, 250), (1, 100), (2, 5), (1, 20), (2, 10), (1, 100)])
-		self.animations["stand_left"] = self.animations["stand_right"].make_x_mirror()
-
-		self.animations["walk_right"] = Animation(
-			split_tiled_image(pygame.image.load(j_path("images", "ANI_Wario_walk_r.png")).convert_alpha(), (24, 29)), 5)
-		self.animations["walk_left"] = self.animations["walk_right"].make_x_mirror()
-
-		self.animations["jump_right"] = Animation([pygame.image.load(j_path("images", "ANI_Wario_jump_r.png")).convert_alpha()],
-												  1)
-		self.animations["jump_left"] = self.animations["jump_right"].make_x_mirror()
-
-		# Load images for the next couple of animations:
-		gotosleep_imgs = split_tiled_image(pygame.image.load(j_path("images", "ANI_Wario_gotosleep_r.png")).convert_alpha(),
-										   (28, 30))
-
-		self.animations["gotosleep_right"] = Animation(gotosleep_imgs, [(0, 15), (1, 15), (2, 15), (3, 15), (4, 15)])
-		self.animations["gotosleep_left"] = self.animations["gotosleep_right"].make_x_mirror()
-
-		self.animations["sleep_right"] = Animation(gotosleep_imgs, [(4, 30), (5, 20), (6, 100), (5, 20)])
-		self.animations["sleep_left"] = self.animations["sleep_right"].make_x_mirror()
-
-		self.animations["wakeup_right"] = Animation(gotosleep_imgs, [(4, 25), (3, 25), (2, 25), (1, 25), (0, 25)])
-		self.animations["wakeup_left"] = self.animations["wakeup_right"].make_x_mirror()
-
-		turn_around_img = split_tiled_image(pygame.image.load(j_path("images", "ANI_Wario_turn.png")).convert_alpha(), (28, 29),
-											(225, 0, 225))
-		self.animations["turn_left"] = Animation(turn_around_img, [(3, 4), (2, 4), (1, 4)])
-		self.animations["turn_right"] = Animation(turn_around_img, [(1, 4), (2, 4), (3, 4)])
-
-		fist_img = split_tiled_image(pygame.image.load(j_path("images", "ANI_Wario_softfist_l.png")).convert_alpha(), (32, 30))
-		self.animations["fist_left"] = Animation(fist_img, 3)
-		self.animations["fist_right"] = self.animations["fist_left"].make_x_mirror()
+		self._add_animations(engine, "stand", j_path("images", "ANI_Wario_stand_r.png"), (20, 29),
+							 [(0, 250), (1, 100), (2, 5), (1, 20), (2, 10), (1, 100)])
+		self._add_animations(engine, "walk", j_path("images", "ANI_Wario_walk_r.png"), (24, 29), 5)
+		self._add_animations(engine, "jump", j_path("images", "ANI_Wario_jump_r.png"), None, 1)
+
+		# The next couple of animations use the same images:
+		gotosleep_path = j_path("images", "ANI_Wario_gotosleep_r.png")
+		self._add_animations(engine, "gotosleep", gotosleep_path, (28, 30), [(0, 15), (1, 15), (2, 15), (3, 15), (4, 15)])
+		self._add_animations(engine, "sleep", gotosleep_path, (28, 30), [(4, 30), (5, 20), (6, 100), (5, 20)])
+		self._add_animations(engine, "wakeup", gotosleep_path, (28, 30), [(4, 25), (3, 25), (2, 25), (1, 25), (0, 25)])
+
+		turn_around_img = engine.assets.get_frames(j_path("images", "ANI_Wario_turn.png"), (28, 29), colorkey=(225, 0, 225))
+		self.animations["turn_left"] = Animation(turn_around_img, [(3, 4), (2, 4), (1, 4)], engine.assets)
+		self.animations["turn_right"] = Animation(turn_around_img, [(1, 4), (2, 4), (3, 4)], engine.assets)
+
+		# The image of the fist looks to the left:
+		fist_path = j_path("images", "ANI_Wario_softfist_l.png")
+		self.animations["fist_left"] = Animation(engine.assets.get_frames(fist_path, (32, 30)), 3, engine.assets)
+		self.animations["fist_right"] = Animation(engine.assets.get_frames(fist_path, (32, 30), flip_x=True), 3, engine.assets)
 
 		# Save the current animation
 		self.current_animation = self.animations["stand_right"]
@@ -380,6 +368,13 @@ class LookComponent(StatesComponent):
 		# Play the current animation
 		self.current_animation.play()
 
+	def _add_animations(self, engine, name, path, tile_size, sprite_order):
+		"""
+		Adds the animation "<name>_right" using the image at path, and "<name>_left" using the mirrored image.
+		"""
+		self.animations[name + "_right"] = Animation(engine.assets.get_frames(path, tile_size), sprite_order, engine.assets)
+		self.animations[name + "_left"] = Animation(engine.assets.get_frames(path, tile_size, flip_x=True), sprite_order, engine.assets)
+
 	def receive_message(self, name, value):
 		super(LookComponent, self).receive_message(name, value)
 		if name == MSGN.LOOKDIRECTION:
@@ -431,14 +426,18 @@ class LookComponent(StatesComponent):
 
 		# Update the current animation:
 		self.current_animation.update()
-		# Calculate the position of the image so its midbottom is aligned with the midbottom of the game_actor
-		surface_pos = self.current_animation.get_surface().get_rect(midbottom = game_actor.rect.midbottom)
-		# Blit the current sprite to the screen:
-		engine.graphics.blit(self.current_animation.get_surface(), surface_pos)
 		# Broadcast the states:
 		game_actor.send_message(MSGN.STATE, self.state)
 		game_actor.send_message(MSGN.LOOKDIRECTION, self.look_direction)
 
+	def draw(self, game_actor, engine):
+		# Calculate the position of the image so its midbottom is aligned with the midbottom of the game_actor
+		surface_pos = self.current_animation.get_rect(midbottom = game_actor.rect.midbottom)
+		# Blit the current sprite (an area of the atlas) to the screen, if it's visible at all:
+		if engine.graphics.is_visible(surface_pos):
+			page, area = self.current_animation.get_frame()
+			engine.graphics.blit(page, surface_pos, area)
+
 	def play_animation(self, animation_name):
 		"""Plays an animation only if the wanted animation isn't
 		already playing.
@@ -1,4 +1,7 @@
+import os
 import sys
+import threading
+import time
 import xml.etree.ElementTree as ET
 
 
@@ -8,119 +11,307 @@ from Graphics import *
 from Sound import *
 from GameActorController import *
 from Actors import *
+from LevelCache import *
+from Assets import *
+from Profiler import *
+from Physics import *
+
+
+class PreloadStates:
+	"""
+	States of the level preloaded in the background, see Engine.preload_level().
+	"""
+	IDLE = 0
+	LOADING = 1
+	READY = 2
+	FAILED = 3
 
 
 class Engine:
-	def __init__(self, screen_size, fps):
-		self._tmx_root = None  # Will be used to store the currently loaded tmx-file:
+	def __init__(self, screen_size, fps, headless=False, rendering=None, limit_fps=None, level="Forest_N1_1.tmx",
+				 streaming=False):
+		"""
+		:param screen_size: Size of the screen in pixels
+		:param fps: Frames per second the game is made for, e.g. animations are timed by it
+		:param headless: True to run without a window (using the dummy video-driver of SDL), e.g. on a build server.
+			Must be decided before anything else of pygame's display is used.
+		:param rendering: False to skip drawing entirely (see Graphics.set_rendering()), default: not headless
+		:param limit_fps: False to run as fast as possible instead of at most fps frames per second,
+			default: not headless
+		:param level: The tmx-file of the first level
+		:param streaming: True to keep only the parts of the levels around the camera in memory, for very big levels
+			(see World.set_streamed_layers()). Needs the level-cache, the layers are streamed from a file next to it.
+		"""
 		self._fps = fps # Save fps
 		self._CLOCK = pygame.time.Clock() # Create pygame.Clock for fps-control
 		self._draw_tile_ids = False # DEBUG: Draw all ids:
+		self.headless = headless
+		self.limit_fps = not headless if limit_fps is None else limit_fps
+
+		# Fixed-timestep mode, see self.set_fixed_timestep():
+		self.fixed_timestep = False
+		self.max_skip = 5  # Maximum amount of simulated frames per rendered frame
+		self._accumulator = 0.  # Time (in seconds) that still has to be simulated
+		self._last_time = None  # Time of the last call of self.update()
+
+		# Without a window, SDL renders into memory:
+		if headless:
+			os.environ["SDL_VIDEODRIVER"] = "dummy"
+			os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
 
 		# Create instance of Graphics-Engine:
-		self.graphics = Graphics(self,screen_size)
+		self.graphics = Graphics(self, screen_size, not headless if rendering is None else rendering)
+		# Create the profiler, disabled until it's needed (F3 shows it on the screen):
+		self.profiler = FrameProfiler(self)
+		self.profiler.budget = 1. / fps
+		# Create the profiler of the game-actors, also disabled until it's needed:
+		self.actor_profiler = ActorProfiler()
+		# Create the cache for images, shared by everything that uses them:
+		self.assets = AssetCache(self)
 		# Create instance of World:
 		self.world = World(self)
 		# Create instance of input-engine
 		self.input = Input(self)
+		# Create the batched physics of the game-actors, used if numpy is installed:
+		self.physics = PhysicsSystem(self)
 		# Create actors-controller
 		self.actors = GameActorController(self)
 		# Create sound-controller (not jet programmed...)
 		self.sound = Sound(self)
+		# Compiled levels, see self._load_tmx():
+		self.level_cache = LevelCache()
+		self.use_level_cache = True
+		self.streaming = streaming
+
+		# Level preloaded in the background, see self.preload_level():
+		self._preload_lock = threading.Lock()
+		self._preload_count = 0  # Increased with every preload, so results of outdated preloads can be ignored
+		self._preload_filepath = None
+		self._preload_state = PreloadStates.IDLE
+		self._preload_result = None  # (level, world) once ready, or the exception if failed
 
-		# Finally, first map (temporary):
-		self._load_tmx("Forest_N1_1.tmx")
+		# Finally, first map:
+		self._load_tmx(level)
 
-		# Var changed by self.load_new_level. If not false, in the next update cycle, the level gets loaded.
+		# Var changed by self.load_new_level. If not false, the level gets swapped in as soon as it's preloaded.
 		self._load_new_level = False
 
 	def update(self):
 		"""
 		Updates everything. Should be called once per frame.
+		In fixed-timestep mode (see self.set_fixed_timestep()), the game is simulated for as many frames as fit into
+		the time passed since the last call, and rendered once.
+		"""
+		self.profiler.begin_frame()
+		self._run_frame(self._get_fixed_steps() if self.fixed_timestep else 1)
+		self._tick()
+		self.profiler.end_frame()
+
+	def step(self, frames=1):
+		"""
+		Runs a number of frames right away, e.g. as fast as possible in headless mode for tests and benchmarks.
+		Every frame is simulated and rendered exactly once, even in fixed-timestep mode.
+		:param frames: The amount of frames
+		:return: None
 		"""
+		for frame in range(frames):
+			self.profiler.begin_frame()
+			self._run_frame(1)
+			self._tick()
+			self.profiler.end_frame()
 
-		# Check if new level should be loaded:
+	def set_fixed_timestep(self, fixed_timestep, max_skip=5):
+		"""
+		In fixed-timestep mode, the game is always simulated fps times per second, no matter how often it's rendered:
+		If a frame takes too long, the game is simulated multiple times before it's rendered again, so it doesn't
+		slow down. Nothing is rendered until the next frame is due, the engine sleeps in the meantime (unless
+		self.limit_fps is True, then the clock waits anyway).
+		:param fixed_timestep: True to turn it on, False to turn it off
+		:param max_skip: The maximum amount of simulated frames per rendered frame. If the machine is too slow even
+			for that, the game slows down instead of never rendering anything.
+		:return: None
+		"""
+		self.fixed_timestep = fixed_timestep
+		self.max_skip = max_skip
+		self._accumulator = 0.
+		self._last_time = None
+
+	def _get_fixed_steps(self):
+		"""
+		Returns how many frames have to be simulated to catch up with the time passed, see self.set_fixed_timestep().
+		"""
+		now = time.perf_counter()
+		step_time = 1. / self._fps
+		# The first frame is simulated right away:
+		if self._last_time is None:
+			self._last_time = now - step_time
+		self._accumulator += now - self._last_time
+		self._last_time = now
+
+		steps = min(int(self._accumulator / step_time), self.max_skip)
+		self._accumulator -= steps * step_time
+		# If the machine is too slow, forget about the time that can't be caught up:
+		if steps == self.max_skip:
+			self._accumulator %= step_time
+		return steps
+
+	def _run_frame(self, steps):
+		"""
+		Simulates the game a number of frames, then renders it (if it was simulated at all, otherwise it waits for the
+		next frame to be simulated, see self._wait_for_next_step()).
+		"""
+		# Check if new level should be loaded, and swap it in as soon as it's preloaded:
 		if self._load_new_level:
-			self._load_tmx(self._load_new_level)
-			self._load_new_level = False
-
-		# Handle events:
-		self._handle_events()
-		# Update input:
-		self.input.update()
-		# Update world:
-		self.world.update()
-		# Update Game-Actors:
-		self.actors.update()
-		# Update screen:
-		self.graphics.update()
-		# Make sure engine doesn't run faster than 60 fps:
-		self._CLOCK.tick(self._fps)
+			preload_state = self.get_preload_state(self._load_new_level)
+			if preload_state in (PreloadStates.READY, PreloadStates.FAILED):
+				self._swap_preloaded_level()
+			# Another level was preloaded in the meantime, so load this one again:
+			elif preload_state == PreloadStates.IDLE:
+				self.preload_level(self._load_new_level)
+		profiler = self.profiler
+		profiler.mark("level")
+
+		for step in range(steps):
+			# Handle events:
+			self._handle_events()
+			profiler.mark("events")
+			# Update input:
+			self.input.update()
+			profiler.mark("input")
+			# Update world:
+			self.world.update()
+			profiler.mark("world")
+			# Update Game-Actors:
+			self.actors.update()
+			profiler.mark("actors")
+
+		# Nothing changed if nothing was simulated:
+		if steps:
+			# Follow the focused game-actor, then draw world and Game-Actors:
+			self.graphics.update_camera()
+			self.world.draw()
+			self.actors.draw()
+			profiler.draw_overlay()
+			profiler.mark("draw")
+			# Update screen:
+			self.graphics.update()
+			profiler.mark("graphics")
+		else:
+			self._wait_for_next_step()
+			# Waiting counts as part of the clock, like self._tick():
+			profiler.mark("clock")
+
+	def _wait_for_next_step(self):
+		"""
+		Called in fixed-timestep mode if no frame had to be simulated yet. Without it, the engine would spin through
+		empty frames until the next one is due, if self.limit_fps is False.
+		"""
+		# Keep the window responsive. The events stay queued, they're read by the input of the next simulated frame:
+		pygame.event.pump()
+		# Sleep until the next frame has to be simulated, self._tick() already waits if the fps are limited:
+		if not self.limit_fps:
+			time.sleep(max(1. / self._fps - self._accumulator, 0))
+
+	def _tick(self):
+		# Make sure engine doesn't run faster than 60 fps (the clock is still ticked to measure the fps):
+		if self.limit_fps:
+			self._CLOCK.tick(self._fps)
+		else:
+			self._CLOCK.tick()
+		self.profiler.mark("clock")
+
+	def get_fps(self):
+		"""
+		Returns the frames per second actually reached, averaged over the last few frames.
+		"""
+		return self._CLOCK.get_fps()
+
 	def _load_tmx(self, filepath):
 		"""
-		Loads the tmx-file 'filepath' and parses it.
+		Loads the tmx-file 'filepath' right away, see self._read_level().
+		"""
+		level = self._read_level(filepath)
+		self._set_level(level, self._build_world(level))
 
-		TODO: Maybe it would be better to move the part that parses tile-csv to the world-class....
+	def _read_level(self, filepath):
+		"""
+		Reads the tmx-file 'filepath'. If it was compiled before and didn't change since, the compiled level is loaded
+		instead, which is much faster. Otherwise it's parsed and compiled for the next time (see LevelCache).
+		In streaming mode, the layers aren't read at all, but streamed from the chunked level (see self.streaming).
+		:return: The Level
 		"""
+		if self.streaming and self.use_level_cache:
+			level = self.level_cache.load(filepath, load_layers=False)
+			chunked_layers = self.level_cache.load_chunked(filepath) if level is not None else None
+			# Compile the level in chunks, if it wasn't before or it's outdated:
+			if chunked_layers is None:
+				level = self._read_full_level(filepath)
+				if self.level_cache.save_chunked(filepath, level):
+					chunked_layers = self.level_cache.load_chunked(filepath)
+			# If it can't be streamed (e.g. because the directory is read-only), it's held in memory:
+			if chunked_layers is not None:
+				level.layers = []
+				level.chunked_layers = chunked_layers
+			return level
+		return self._read_full_level(filepath)
 
-		# Empty self.actors:
-		self.actors = GameActorController(self)
-		# TODO: Find a way to empty self.world
-		self.world = World(self)
+	def _read_full_level(self, filepath):
+		"""
+		Reads the tmx-file 'filepath' with all its layers, see self._read_level().
+		:return: The Level
+		"""
+		# Load the compiled level, if it's up to date:
+		level = self.level_cache.load(filepath) if self.use_level_cache else None
+		# Else, parse the tmx-file and compile it:
+		if level is None:
+			level = self._parse_tmx(filepath)
+			if self.use_level_cache:
+				self.level_cache.save(filepath, level)
+		return level
+
+	def _parse_tmx(self, filepath):
+		"""
+		Parses the tmx-file 'filepath'.
+		:return: The parsed Level
+		"""
+		level = Level()
 
 		# Open and parse the tmx-file
-		self._tmx_root = ET.parse(filepath).getroot()
+		tmx_root = ET.parse(filepath).getroot()
 
 		# Get grid-size (in tiles)
-		grid_size = (int(self._tmx_root.attrib["width"]), int(self._tmx_root.attrib["height"]))
-		# Set the grid-size in the world:
-		self.world.set_gid_size(grid_size)
+		level.grid_size = (int(tmx_root.attrib["width"]), int(tmx_root.attrib["height"]))
 
 		# Get tile-size (in pixels)
-		tile_size = (int(self._tmx_root.attrib["tilewidth"]), int(self._tmx_root.attrib["tileheight"]))
-		# Set the tile-size in the world:
-		self.world.set_tile_size(tile_size)
+		level.tile_size = (int(tmx_root.attrib["tilewidth"]), int(tmx_root.attrib["tileheight"]))
 
 		######
 		# Next, process the tilesets:
 		# For tileset..
-		for tileset in self._tmx_root.findall("tileset"):
+		for tileset in tmx_root.findall("tileset"):
 			# If tileset is "world":
 			if tileset.attrib["name"] == "world":
 				# Dor tile in this tileset:
 				for tile in tileset.findall("tile"):
 					# For property in tile:
-					for property in tile.find("properties").findall("property"):
-						# Update tile-property
-						self.world.set_tile_property(int(tile.attrib["id"]), property.attrib["name"], property.attrib["value"])
+					if tile.find("properties") is not None:
+						for property in tile.find("properties").findall("property"):
+							# Save tile-property
+							level.tile_properties.append((int(tile.attrib["id"]), property.attrib["name"], property.attrib["value"]))
+					# If the tile is animated, save the animation:
+					if tile.find("animation") is not None:
+						frames = [(int(frame.attrib["tileid"]), int(frame.attrib["duration"]))
+								  for frame in tile.find("animation").findall("frame")]
+						level.tile_animations.append((int(tile.attrib["id"]), frames))
 
 		######
-		# Next, process the layers: Where is what tile?
-		# For every layer...
-		all_layers = self._tmx_root.findall("layer")
-		for layer in range(len(all_layers)):
-			# Get and save the raw csv data which contains information about where which tile is:
-			csv_data = all_layers[layer].find("data").text
-			# First, split the csv in rows:
-			splitted_data = csv_data.split("\n")
-			# For row in csv_data:
-			for row in range(len(splitted_data)):
-				# Make sure the row isn't empty:
-				if not splitted_data[row] == "":
-					splitted_row = splitted_data[row].split(",")
-					# For column in csv_data (= for tile)
-					for column in range(len(splitted_row)):
-						# Make sure the tile isn't empty:
-						if not splitted_row[column] == "":
-							# Calculate the position of the tile:
-							position = list(map(lambda x, y: x*y, (column, row-1), tile_size))
-							# Finally create the tile:
-							self.world.create_tile(layer, position, tile_size, int(splitted_row[column])-1)
+		# Next, process the layers: Where is what tile? The world knows how to decode them:
+		level.layers = World.parse_tmx_layers(tmx_root, level.grid_size)
 
 		#####
 		# Next, process object-group-layers:
 		# For object-group-layer...
-		for objectgroup in self._tmx_root.findall("objectgroup"):
+		for objectgroup in tmx_root.findall("objectgroup"):
 			# If layer-name == "main"...
 			if objectgroup.attrib["name"] == "game_actors":
 				# For every object in that layer...
@@ -129,14 +320,172 @@ class Engine:
 					actor_name = object.attrib["name"]
 					# Get the position of that object
 					position = (float(object.attrib["x"]), float(object.attrib["y"])-float(object.attrib["height"]))
-					# Spawn a game-actor with that name:
-					self.actors.spawn_game_actor(actor_name, position)
+					# Save the game-actor with that name:
+					level.actors.append((actor_name, position))
+
+		return level
+
+	def _build_world(self, level):
+		"""
+		Creates the world of a level. Doesn't change the engine, so it can be done in another thread.
+		The clips of its animations are packed into an atlas of their own, which replaces the one of the current level
+		together with the world (see self._set_level()).
+		:param level: The Level, see self._read_level()
+		:return: The new World
+		"""
+		clip_cache = ClipCache()
+		self.assets.set_thread_clips(clip_cache)
+		try:
+			world = self._fill_world(World(self), level)
+		finally:
+			self.assets.set_thread_clips(None)
+		world.clip_cache = clip_cache
+		return world
+
+	def _fill_world(self, world, level):
+		"""
+		Sets tiles, animations and layers of a new world, see self._build_world().
+		:return: The world
+		"""
+		# Set the grid-size and tile-size in the world:
+		world.set_gid_size(level.grid_size)
+		world.set_tile_size(level.tile_size)
+
+		# Update tile-properties:
+		for tile_id, property_name, property_value in level.tile_properties:
+			world.set_tile_property(tile_id, property_name, property_value)
+		# Set the animations, durations converted from milliseconds to frames:
+		for tile_id, frames in level.tile_animations:
+			world.set_tile_animation(tile_id, [(frame_tile_id, max(1, int(round(duration*self._fps/1000.))))
+											   for frame_tile_id, duration in frames])
+
+		# Set the tiles of every layer, or stream them:
+		if level.chunked_layers is not None:
+			world.set_streamed_layers(level.chunked_layers)
+		for layer in range(len(level.layers)):
+			world.set_layer(layer, level.layers[layer])
+		# Draw the static tiles onto chunks, now that every tile exists:
+		world.bake_layers()
+		return world
+
+	def _set_level(self, level, world):
+		"""
+		Replaces world and game-actors by the ones of a level.
+		:param level: The Level, see self._read_level()
+		:param world: The World of the level, see self._build_world()
+		"""
+		# Stop streaming the old world:
+		if self.world is not world:
+			self.world.close()
+		self.world = world
+		# The clips of the old level aren't needed anymore, the ones of the new world were packed on their own:
+		self.assets.set_clips(world.clip_cache)
+		# Empty self.actors:
+		self.physics.clear()
+		self.actors = GameActorController(self)
+		# The background of the dirty-rect mode shows the old world:
+		self.graphics.invalidate_background()
+
+		# Add the game-actors, most of them are only spawned when the camera approaches them:
+		for actor_name, position in level.actors:
+			self.actors.add_spawn_point(actor_name, position)
+
+	def _preload(self, filepath, preload_count):
+		"""
+		Reads a level and builds its world. Runs in its own thread, see self.preload_level().
+		"""
+		try:
+			level = self._read_level(filepath)
+			result = (level, self._build_world(level))
+			state = PreloadStates.READY
+		except Exception as error:
+			result = error
+			state = PreloadStates.FAILED
+
+		with self._preload_lock:
+			# Only save the result if no other level was preloaded in the meantime:
+			outdated = preload_count != self._preload_count
+			if not outdated:
+				self._preload_result = result
+				self._preload_state = state
+		if outdated:
+			self._discard_preload_result(state, result)
+
+	@staticmethod
+	def _discard_preload_result(state, result):
+		"""
+		Frees a preloaded level that won't be used, e.g. stops streaming its world.
+		"""
+		if state == PreloadStates.READY:
+			result[1].close()
+
+	def _swap_preloaded_level(self):
+		"""
+		Replaces the current level by the preloaded one. Called at the beginning of a frame.
+		"""
+		with self._preload_lock:
+			state, result = self._preload_state, self._preload_result
+			self._preload_filepath = None
+			self._preload_state = PreloadStates.IDLE
+			self._preload_result = None
+		self._load_new_level = False
+
+		# If preloading failed, raise the error here, as if the level was loaded directly:
+		if state == PreloadStates.FAILED:
+			raise result
+		self._set_level(*result)
 
 	def _handle_events(self):
 		for event in self.input.events:
 			if event.type == QUIT:
 				pygame.quit()
 				sys.exit()
+			# F3 shows the profiler, see FrameProfiler:
+			elif event.type == KEYDOWN and event.key == K_F3:
+				self.profiler.show_overlay = not self.profiler.show_overlay
+				self.profiler.set_enabled(self.profiler.show_overlay)
+
+	def preload_level(self, filename):
+		"""
+		Starts loading a level in the background (reading and parsing the file, building the world) while the current
+		level keeps running. Nothing changes until load_new_level() is called with the same file.
+		:param filename: The path of the tmx-file
+		:return: None
+		"""
+		with self._preload_lock:
+			# Don't load the same level twice:
+			if self._preload_filepath == filename and self._preload_state != PreloadStates.FAILED:
+				return
+			# The level preloaded before is replaced:
+			replaced_state, replaced_result = self._preload_state, self._preload_result
+			self._preload_count += 1
+			self._preload_filepath = filename
+			self._preload_state = PreloadStates.LOADING
+			self._preload_result = None
+			preload_count = self._preload_count
+		self._discard_preload_result(replaced_state, replaced_result)
+
+		preload_thread = threading.Thread(target=self._preload, args=(filename, preload_count), name="Level preloader")
+		preload_thread.daemon = True
+		preload_thread.start()
+
+	def get_preload_state(self, filename=None):
+		"""
+		Returns the state of the level preloaded in the background (see PreloadStates).
+		:param filename: If given, IDLE is returned if another level than this one is preloaded
+		:return: PreloadStates.IDLE, LOADING, READY or FAILED
+		"""
+		with self._preload_lock:
+			if filename is not None and filename != self._preload_filepath:
+				return PreloadStates.IDLE
+			return self._preload_state
 
 	def load_new_level(self, filename):
+		"""
+		Replaces the current level by another one. The level gets preloaded in the background if it isn't already
+		(see self.preload_level()), and swapped in at the beginning of the first frame after it's ready.
+		:param filename: The path of the tmx-file
+		:return: None
+		"""
 		self._load_new_level = filename
+		self.preload_level(filename)
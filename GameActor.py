@@ -1,6 +1,11 @@
+import time
+
 from globals import pygame
 
 class GameActor(object):
+	# True if the game-actor is always updated, wherever it is, see GameActorController:
+	always_active = False
+
 	def __init__(self, position, engine_wrapper):
 		# Update the static variable engine:
 		# This is kind of dangerous if we had multiple engines. Luckily we don't.
@@ -12,6 +17,27 @@ class GameActor(object):
 		# Initialize the components list, classes inheriting from this one will fill it with components
 		self.components = []
 
+	@property
+	def components(self):
+		return self._components
+
+	@components.setter
+	def components(self, components):
+		"""
+		Sets the components and precomputes which of them receive which message, see self.send_message().
+		The list must not be changed afterwards, assign a new one instead.
+		"""
+		self._components = components
+		# Components that receive every message:
+		self._broadcast_handlers = [(component, component.receive_message) for component in components
+									if component.handled_messages is None]
+		# The components receiving a message, by its name, in the order of the components:
+		self._message_handlers = {}
+		for component in components:
+			for name in component.handled_messages or ():
+				self._message_handlers[name] = [(receiver, receiver.receive_message) for receiver in components
+												if receiver.handled_messages is None or name in receiver.handled_messages]
+
 	def update(self):
 		"""Updates every component - should not be changed by inheriting classes!"""
 		# For every component
@@ -24,21 +50,49 @@ class GameActor(object):
 		# Call the private update-method - used by inhertiting classes.
 		self._update()
 
+	def update_profiled(self, actor_profiler):
+		"""Like self.update(), but measures every component and counts the messages, see Profiler.ActorProfiler"""
+		# Count the messages sent during the update:
+		self._actor_profiler = actor_profiler
+		self.send_message = self._send_message_counted
+		actor_start = time.perf_counter()
+		try:
+			for component in self.components:
+				self.current_component = component
+				component_start = time.perf_counter()
+				component.update(self, self.engine)
+				actor_profiler.add_component_time(type(component).__module__.split(".")[-1] + "." +
+												  type(component).__name__, time.perf_counter() - component_start)
+			self._update()
+		finally:
+			# Use the normal send_message() again:
+			del self.send_message
+		actor_profiler.add_actor_time(type(self).__name__, time.perf_counter() - actor_start)
+
+	def _send_message_counted(self, name, value):
+		self._actor_profiler.count_message(type(self).__name__, name)
+		GameActor.send_message(self, name, value)
+
 	def _update(self):
 		"""This method should be changed by inheriting classes, using the data the components have manipulated"""
 		pass
 
+	def draw(self):
+		"""Draws every component - called once per rendered frame, see GameActorComponent.draw()"""
+		for component in self.components:
+			component.draw(self, self.engine)
+
 	def send_message(self, name, value):
 		"""
-		Used by the components to send messages to all other components.
-		Weather the other components do something with it is up to themselves.
+		Used by the components to send messages to the other components.
+		Only the components handling the message receive it (see GameActorComponent.handled_messages).
 		"""
-		# For everycomponent
-		for component in self.components:
+		# For every component handling the message
+		for component, receive_message in self._message_handlers.get(name, self._broadcast_handlers):
 			# ...except the one that is sending the message (see self.update())
 			if component is not self.current_component:
 				# Sen the message
-				component.receive_message(name, value)
+				receive_message(name, value)
 
 	def receive_actor_message(self, sender_id, name, value):
 		"""
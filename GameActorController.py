@@ -3,21 +3,65 @@ import logging
 from EngineController import *
 
 
+class SpawnPoint(object):
+	"""
+	A game-actor of the level that is only spawned when the camera approaches it, see GameActorController.
+	"""
+
+	def __init__(self, actor_type, position):
+		self.actor_type = actor_type
+		self.position = position
+		self.actor_id = None  # The id of the game-actor spawned from it, None if it isn't spawned at the moment
+
+
 class GameActorController(EngineController):
 	"""
 	Cares for and contains all game-actors active or inactive in the game.
+
+	The game-actors are also sorted into a spatial hash: A grid of cells of self.cell_size pixels, each containing the
+	game-actors whose rects touch it. It's updated whenever a game-actor moved, so finding the game-actors in an area
+	(see self.get_actors_in_rect()) only checks the ones nearby, no matter how many there are on the level.
+
+	Like in the original game, only the game-actors around the camera are active (see self.set_margins()):
+	-Game-actors of the level are spawn-points (see self.add_spawn_point()) and only spawned when they come within
+	 self.spawn_margin pixels of the screen. Once they left it, they're spawned again next time.
+	-Game-actors farther than self.activity_margin pixels from the screen aren't updated or drawn.
+	-Game-actors from spawn-points farther than self.despawn_margin pixels from the screen are deleted.
+	Game-actors with always_active (e.g. Wario) are spawned right away and never suspended or deleted.
 	"""
 
-	def __init__(self, engine, log_level = logging.ERROR):
+	def __init__(self, engine, log_level = logging.ERROR, cell_size=64):
+		"""
+		:param engine: The complete engine
+		:param log_level: The level of the logger
+		:param cell_size: The size of the cells of the spatial hash in pixels, best a few times the size of a game-actor
+		"""
 		super(GameActorController, self).__init__(engine)
 		# All game-actors, sorted by instance id (id())
 		self.actors = {}
+		# The spatial hash: (cell-x, cell-y): {actor-id: game-actor} (dicts, so the order doesn't change between runs)
+		self.cell_size = cell_size
+		self._cells = {}
+		# The cells (left, top, right, bottom - inclusive) every game-actor was sorted into, by actor-id:
+		self._actor_cells = {}
 		# Create deletion buffer-list, so actors can't delete while updating:
 		self.actor_deletion_list = []
 		self.current_game_actor = None
 
 		self.game_actor_types = {"Wario": Wario, "Spearhead": SpearHead}
 
+		# Activity around the camera, see self.set_margins():
+		self.culling = True  # False to spawn and update every game-actor, wherever it is
+		self.activity_margin = 64
+		self.spawn_margin = 32
+		self.despawn_margin = 160
+		# The spawn-points that aren't always active, sorted into cells of the spatial hash:
+		self._spawn_point_cells = {}
+		self._spawn_points_in_range = {}  # id(spawn-point): spawn-point, of the ones within spawn_margin
+		self._spawn_point_of_actor = {}  # actor-id: the spawn-point it was spawned from
+		# The game-actors updated in the last frame and drawn, as (actor-id, game-actor):
+		self._active_actors = []
+
 		# Create logger
 		self.logger = logging.getLogger("Game Actor Controller")
 		self.logger.setLevel(log_level)
@@ -45,7 +89,7 @@ class GameActorController(EngineController):
 		:param world: The world-controller
 		:param graphics: The graphics-controller
 		:param sound: The sound-controller
-		:return: None
+		:return: The new game-actor
 		"""
 		# Check if game_actor_type is existent:
 		assert actor_type in self.game_actor_types, "Unknown GameActor-type \"%s\""
@@ -53,10 +97,99 @@ class GameActorController(EngineController):
 		new_actor = self.game_actor_types[actor_type](position, self.engine)
 		# Add it to list
 		self.actors[id(new_actor)] = new_actor
+		self._update_cells(id(new_actor), new_actor)
 
 		# Log the event:
 		self.logger.debug("Created game-actor with type %s at position (%f, %f) with %i" %
 			(actor_type, position[0], position[1], id(new_actor), ))
+		return new_actor
+
+	def add_spawn_point(self, actor_type, position):
+		"""
+		Adds a game-actor of the level. Unless its type is always active (or self.culling is False), it's only spawned
+		when the camera approaches it, see the class-description.
+		:param actor_type: The type of the game-actor, e.g. "Spearhead"
+		:param position: The position of the game-actor
+		:return: None
+		"""
+		assert actor_type in self.game_actor_types, "Unknown GameActor-type \"%s\"" % actor_type
+		if self.game_actor_types[actor_type].always_active or not self.culling:
+			self.spawn_game_actor(actor_type, position)
+			return
+		spawn_point = SpawnPoint(actor_type, position)
+		cell = (int(position[0]) // self.cell_size, int(position[1]) // self.cell_size)
+		self._spawn_point_cells.setdefault(cell, []).append(spawn_point)
+
+	def set_margins(self, activity_margin=None, spawn_margin=None, despawn_margin=None):
+		"""
+		Sets how far (in pixels) around the screen game-actors are active, spawned and deleted, see the
+		class-description. Arguments that are None aren't changed.
+		:return: None
+		"""
+		if activity_margin is not None:
+			self.activity_margin = activity_margin
+		if spawn_margin is not None:
+			self.spawn_margin = spawn_margin
+		if despawn_margin is not None:
+			self.despawn_margin = despawn_margin
+		# Otherwise game-actors would be deleted right after they were spawned:
+		assert self.spawn_margin <= self.despawn_margin, "The spawn-margin must not exceed the despawn-margin"
+
+	def set_culling(self, culling):
+		"""
+		Turns the activity around the camera on or off. Without it, every game-actor is spawned and updated.
+		Spawn-points added before are spawned right away.
+		:param culling: True to turn it on, False to turn it off
+		:return: None
+		"""
+		self.culling = culling
+		if not culling:
+			for spawn_points in self._spawn_point_cells.values():
+				for spawn_point in spawn_points:
+					if spawn_point.actor_id is None:
+						self.spawn_game_actor(spawn_point.actor_type, spawn_point.position)
+			self._spawn_point_cells = {}
+			self._spawn_points_in_range = {}
+			self._spawn_point_of_actor = {}
+
+	def _update_spawn_points(self, viewport):
+		"""
+		Spawns the game-actors of the spawn-points that just came within self.spawn_margin of the screen.
+		"""
+		spawn_rect = viewport.inflate(2*self.spawn_margin, 2*self.spawn_margin)
+		cell_range = self._get_cell_range(spawn_rect)
+		spawn_points_in_range = {}
+		for cell_x in range(cell_range[0], cell_range[2]+1):
+			for cell_y in range(cell_range[1], cell_range[3]+1):
+				for spawn_point in self._spawn_point_cells.get((cell_x, cell_y), ()):
+					if spawn_rect.collidepoint(spawn_point.position):
+						spawn_points_in_range[id(spawn_point)] = spawn_point
+						# Only spawned when it comes into range, not as long as it's in range:
+						if id(spawn_point) not in self._spawn_points_in_range and spawn_point.actor_id is None:
+							new_actor = self.spawn_game_actor(spawn_point.actor_type, spawn_point.position)
+							spawn_point.actor_id = id(new_actor)
+							self._spawn_point_of_actor[id(new_actor)] = spawn_point
+		self._spawn_points_in_range = spawn_points_in_range
+
+	def _get_active_actors(self, viewport):
+		"""
+		Returns the game-actors within self.activity_margin of the screen, in the order they were spawned, and
+		deletes the ones from spawn-points that are farther than self.despawn_margin.
+		:return: List of (actor-id, game-actor)
+		"""
+		activity_rect = viewport.inflate(2*self.activity_margin, 2*self.activity_margin)
+		nearby_actors = self._get_nearby_actors(activity_rect)
+		despawn_rect = viewport.inflate(2*self.despawn_margin, 2*self.despawn_margin)
+		active_actors = []
+		for actor_id, actor in self.actors.items():
+			if actor.always_active:
+				active_actors.append((actor_id, actor))
+				continue
+			if actor_id in nearby_actors and actor.rect.colliderect(activity_rect):
+				active_actors.append((actor_id, actor))
+			if actor_id in self._spawn_point_of_actor and not actor.rect.colliderect(despawn_rect):
+				self.kill_game_actor(actor_id)
+		return active_actors
 
 	def kill_game_actor(self, actor_id):
 		"""
@@ -70,15 +203,56 @@ class GameActorController(EngineController):
 			self.actor_deletion_list.append(actor_id)
 
 	def update(self):
-		# Update the game-actors
-		for actor in self.actors.items():
-			self.current_game_actor = actor[0]
-			actor[1].update()
+		# Decide which game-actors are updated:
+		if self.culling:
+			viewport = self.engine.graphics.get_viewport()
+			self._update_spawn_points(viewport)
+			self._active_actors = self._get_active_actors(viewport)
+		else:
+			self._active_actors = list(self.actors.items())
+
+		physics = self.engine.physics
+		# Suspended game-actors aren't moved by the batched physics either:
+		physics.set_active_actors(self._active_actors if self.culling else None)
+		# Add the gravity of all game-actors at once (see Physics.PhysicsSystem):
+		physics.apply_gravity()
+
+		# Update the game-actors, measuring them if the actor-profiler is enabled (see Profiler.ActorProfiler):
+		actor_profiler = self.engine.actor_profiler
+		if actor_profiler.enabled:
+			for actor in self._active_actors:
+				self.current_game_actor = actor[0]
+				actor[1].update_profiled(actor_profiler)
+				self._update_cells(actor[0], actor[1])
+		else:
+			for actor in self._active_actors:
+				self.current_game_actor = actor[0]
+				actor[1].update()
+				# Keep the spatial hash up to date for the game-actors updated after this one:
+				self._update_cells(actor[0], actor[1])
+
+		# Move all game-actors at once:
+		for actor in physics.apply_velocity():
+			self._update_cells(id(actor), actor)
 
 		# Delete the wanted game-actors:
 		for actor_id in self.actor_deletion_list:
+			physics.remove_actor(self.actors[actor_id])
+			self._remove_from_cells(actor_id)
+			# Its spawn-point spawns it again the next time the camera approaches it:
+			spawn_point = self._spawn_point_of_actor.pop(actor_id, None)
+			if spawn_point is not None:
+				spawn_point.actor_id = None
 			del self.actors[actor_id]
 			self.logger.debug("Deleted game-actor with id {0}.".format(actor_id))
+		if self.actor_deletion_list:
+			self._active_actors = [actor for actor in self._active_actors if actor[0] in self.actors]
+		self.actor_deletion_list = []
+
+	def draw(self):
+		# Draw the game-actors that are active (see self.update()):
+		for actor_id, actor in self._active_actors:
+			actor.draw()
 
 	def send_actor_message(self, sender_id, receiver_id, name, value):
 		"""
@@ -89,9 +263,93 @@ class GameActorController(EngineController):
 		:param value: The value of the message, e.g. 10.
 		:return: None.
 		"""
-		receiver_id = self._check_actor_id(self, receiver_id)
+		receiver_id = self._check_actor_id(receiver_id)
+
+		self.actors[receiver_id].receive_actor_message(sender_id, name, value)
+
+	def _get_cell_range(self, rect):
+		"""
+		Returns the cells (left, top, right, bottom - inclusive) a rect touches.
+		"""
+		cell_size = self.cell_size
+		return (rect.left // cell_size, rect.top // cell_size,
+				(rect.right - 1) // cell_size, (rect.bottom - 1) // cell_size)
+
+	def _update_cells(self, actor_id, actor):
+		"""
+		Sorts a game-actor into the cells its rect touches, if it moved to other cells since the last time.
+		"""
+		cell_range = self._get_cell_range(actor.rect)
+		if self._actor_cells.get(actor_id) == cell_range:
+			return
+		self._remove_from_cells(actor_id)
+		self._actor_cells[actor_id] = cell_range
+		for cell_x in range(cell_range[0], cell_range[2]+1):
+			for cell_y in range(cell_range[1], cell_range[3]+1):
+				self._cells.setdefault((cell_x, cell_y), {})[actor_id] = actor
 
-		self.actors[receiver_id].send_actor_message(sender_id, name, value)
+	def _remove_from_cells(self, actor_id):
+		"""
+		Removes a game-actor from the spatial hash.
+		"""
+		cell_range = self._actor_cells.pop(actor_id, None)
+		if cell_range is None:
+			return
+		for cell_x in range(cell_range[0], cell_range[2]+1):
+			for cell_y in range(cell_range[1], cell_range[3]+1):
+				cell = self._cells[(cell_x, cell_y)]
+				del cell[actor_id]
+				# Don't keep empty cells, so the hash doesn't grow with every cell ever visited:
+				if not cell:
+					del self._cells[(cell_x, cell_y)]
+
+	def _get_nearby_actors(self, rect):
+		"""
+		Returns the game-actors sorted into the cells a rect touches, without checking their rects.
+		:return: Dict of actor-id: game-actor
+		"""
+		cell_range = self._get_cell_range(rect)
+		nearby_actors = {}
+		for cell_x in range(cell_range[0], cell_range[2]+1):
+			for cell_y in range(cell_range[1], cell_range[3]+1):
+				cell = self._cells.get((cell_x, cell_y))
+				if cell:
+					nearby_actors.update(cell)
+		return nearby_actors
+
+	def get_actors_in_rect(self, rect, exclude_id=None):
+		"""
+		Returns every game-actor whose rect overlaps a rect.
+		:param rect: The rect in world-coordinates
+		:param exclude_id: A game-actor or game-actor-id that isn't returned, e.g. the one asking
+		:return: A list of game-actors
+		"""
+		rect = pygame.Rect(rect)
+		exclude_id = id(exclude_id) if exclude_id is not None and type(exclude_id) != int else exclude_id
+		return [actor for actor_id, actor in self._get_nearby_actors(rect).items()
+				if actor_id != exclude_id and actor.rect.colliderect(rect)]
+
+	def get_actors_in_radius(self, position, radius, exclude_id=None):
+		"""
+		Returns every game-actor whose rect is (at least partly) within a radius around a position.
+		:param position: The center of the circle in world-coordinates
+		:param radius: The radius in pixels
+		:param exclude_id: A game-actor or game-actor-id that isn't returned, e.g. the one asking
+		:return: A list of game-actors
+		"""
+		exclude_id = id(exclude_id) if exclude_id is not None and type(exclude_id) != int else exclude_id
+		bounding_rect = pygame.Rect(position[0] - radius, position[1] - radius, 2*radius + 1, 2*radius + 1)
+		actors = []
+		for actor_id, actor in self._get_nearby_actors(bounding_rect).items():
+			if actor_id == exclude_id:
+				continue
+			# The distance to the nearest point of the rect:
+			rect = actor.rect
+			distance_x = max(rect.left - position[0], 0, position[0] - (rect.right - 1))
+			distance_y = max(rect.top - position[1], 0, position[1] - (rect.bottom - 1))
+			if distance_x*distance_x + distance_y*distance_y <= radius*radius:
+				actors.append(actor)
+		return actors
 
 	def get_colliding_actors(self, actor_id):
 		"""
@@ -100,7 +358,4 @@ class GameActorController(EngineController):
 		:return: A list containing all game-actors that collide.
 		"""
 		current_actor_id = self._check_actor_id(actor_id)
-		tmp_rects = {actor[0]: actor[1].rect for actor in self.actors}
-		del tmp_rects[current_actor_id]
-		return [self.actors[actor_rect[0]] for actor_rect in
-				self.actors[current_actor_id].rect.collidedictall(tmp_rects)]
+		return self.get_actors_in_rect(self.actors[current_actor_id].rect, current_actor_id)
@@ -5,44 +5,210 @@ from os.path import join as j_path
 
 
 class Graphics(EngineController):
-	def __init__(self, engine, screen_size):
+	def __init__(self, engine, screen_size, rendering=True):
 		super(Graphics, self).__init__(engine)
 		self.screen_size = screen_size
 		self.SCREEN = pygame.display.set_mode(screen_size)
 		self.BLACK_SCREEN = pygame.Surface(screen_size)
+		# If False, nothing is drawn and the screen is never updated, see self.set_rendering():
+		self.rendering = rendering
 
+		# The camera: Everything drawn with blit() and draw_rect() is drawn relative to its position.
 		self.camera_pos = [0, 0]
-		self.camera_center_rect = None
+		self.camera_center_rect = None  # Rect the camera follows, see self.set_camera_focus()
+		self.viewport = pygame.Rect(self.camera_pos, screen_size)  # The part of the world that's visible
+
+		# Dirty-rect mode, see self.set_dirty_rect_mode():
+		self.dirty_rect_mode = False
+		self.BACKGROUND = pygame.Surface(screen_size)  # What's behind everything that's drawn every frame
+		self._target = self.SCREEN  # The surface blit() draws on, either SCREEN or BACKGROUND
+		self._dirty_rects = []  # Rects drawn on in this frame
+		self._last_dirty_rects = []  # Rects drawn on in the last frame
+		self._background_valid = False  # False if the background has to be drawn again, e.g. if the camera moved
+		self._full_update = True  # True if the whole screen has to be updated in this frame
 		pygame.font.init()
 		self.font =  pygame.font.Font(j_path("Other Resources", "Actor-Regular.ttf"), 14)
 		self.small_font = pygame.font.Font(j_path("Other Resources", "Actor-Regular.ttf"), 7)
 
 	def set_camera_focus(self, game_actor):
+		"""
+		Makes the camera follow a game-actor.
+		:param game_actor: The game-actor that should be in the center of the screen
+		:return: None
+		"""
 		self.camera_center_rect = game_actor.rect
+		self.update_camera()
+
+	def update_camera(self):
+		"""
+		Centers the camera on the rect it follows, without showing anything outside of the level.
+		Called by the engine before world and game-actors are drawn, so they're drawn where the focused game-actor is
+		in this frame.
+		"""
+		if self.camera_center_rect is None:
+			return
+		# Center the viewport on the focused rect:
+		self.viewport.center = self.camera_center_rect.center
+		# Make sure the viewport stays inside the level:
+		level_size = list(map(lambda x, y: x*y, self.engine.world.get_grid_size(), self.engine.world.get_tile_size()))
+		self.viewport.left = max(min(self.viewport.left, level_size[0]-self.viewport.width), 0)
+		self.viewport.top = max(min(self.viewport.top, level_size[1]-self.viewport.height), 0)
+		# If the camera moved, the background doesn't fit anymore:
+		if self.camera_pos != list(self.viewport.topleft):
+			self._background_valid = False
+		# Update the position of the camera:
+		self.camera_pos = list(self.viewport.topleft)
+
+	def get_viewport(self):
+		"""
+		Returns the part of the world that's visible on the screen, in world-coordinates.
+		"""
+		return self.viewport.copy()
+
+	def is_visible(self, rect):
+		"""
+		Returns True if a rect (in world-coordinates) is at least partly visible on the screen.
+		Use it to skip drawing things that wouldn't be seen anyway.
+		"""
+		return self.viewport.colliderect(rect)
+
+	def world_to_screen(self, position):
+		"""
+		Converts a position in the world to a position on the screen.
+		"""
+		return position[0]-self.camera_pos[0], position[1]-self.camera_pos[1]
+
+	def set_rendering(self, rendering):
+		"""
+		Turns rendering on or off. Without rendering, blit(), draw_rect() and draw_text() do nothing and the screen
+		is never updated, but the camera still moves. Useful to simulate the game as fast as possible, see
+		Engine(headless=True).
+		:param rendering: True to turn it on, False to turn it off
+		:return: None
+		"""
+		self.rendering = rendering
+		# Whatever is on the screen now is outdated:
+		self._background_valid = False
+		self._full_update = True
+
+	def set_dirty_rect_mode(self, dirty_rect_mode):
+		"""
+		In dirty-rect mode, only the parts of the screen that were drawn on in this or the last frame are updated,
+		instead of the whole screen. Static things (like the static tiles of the world) are drawn onto the background
+		only when it changed (see self.needs_background()), and the background is used to clean up
+		the parts drawn on after every frame. Faster if the camera stands still and only a few things move.
+		:param dirty_rect_mode: True to turn it on, False to turn it off
+		:return: None
+		"""
+		self.dirty_rect_mode = dirty_rect_mode
+		self._dirty_rects = []
+		self._last_dirty_rects = []
+		self._background_valid = False
+		self._full_update = True
+
+	def needs_background(self):
+		"""
+		Returns True if the background must be drawn again in this frame, using begin_background() and
+		commit_background(). Always False if not in dirty-rect mode.
+		"""
+		return self.dirty_rect_mode and not self._background_valid
+
+	def invalidate_background(self):
+		"""
+		Makes sure the background gets drawn again in the next frame, e.g. because a static tile changed.
+		"""
+		self._background_valid = False
+
+	def begin_background(self):
+		"""
+		Clears the background. Until commit_background() is called, blit() draws onto the background
+		instead of the screen.
+		"""
+		self.BACKGROUND.blit(self.BLACK_SCREEN, (0, 0))
+		self._target = self.BACKGROUND
+
+	def commit_background(self):
+		"""
+		Makes blit() draw onto the screen again and copies the new background onto the screen, which
+		then gets updated completely.
+		"""
+		self._target = self.SCREEN
+		self.SCREEN.blit(self.BACKGROUND, (0, 0))
+		self._background_valid = True
+		self._full_update = True
 
 	def blit(self, surface, position=(0, 0), area=None):
-		self.SCREEN.blit(surface, position, area)
+		"""
+		Blits a surface onto the screen.
+		:param position: The position in world-coordinates
+		:param area: The part of the surface to blit, e.g. a frame of a texture atlas (see Atlas)
+		"""
+		if not self.rendering:
+			return
+		rect = self._target.blit(surface, self.world_to_screen(position), area)
+		if self.dirty_rect_mode and self._target is self.SCREEN:
+			self._dirty_rects.append(rect)
 
 	def draw_rect(self, rect, color, width):
-		pygame.draw.rect(self.SCREEN,color, rect, width)
+		"""
+		Draws a rect onto the screen.
+		:param rect: The rect in world-coordinates
+		"""
+		if not self.rendering:
+			return
+		rect = pygame.draw.rect(self.SCREEN, color, pygame.Rect(rect).move(-self.camera_pos[0], -self.camera_pos[1]), width)
+		if self.dirty_rect_mode:
+			self._dirty_rects.append(rect)
 
 	def draw_text(self, text, position, color):
+		"""
+		Draws text onto the screen. Unlike blit(), the position is on the screen, not in the world.
+		"""
+		if not self.rendering:
+			return
 		text = str(text)
 		label = self.font.render(text, 1, color)
-		self.SCREEN.blit(label, position)
+		rect = self.SCREEN.blit(label, position)
+		if self.dirty_rect_mode:
+			self._dirty_rects.append(rect)
 
 	def draw_small_text(self, text, position, color):
+		if not self.rendering:
+			return
 		text = str(text)
 		label = self.small_font.render(text, 1, color)
-		self.SCREEN.blit(label, position)
+		rect = self.SCREEN.blit(label, position)
+		if self.dirty_rect_mode:
+			self._dirty_rects.append(rect)
 
 	def update(self, area = None):
-		# Calculate the cameras position:
-		if area is not None:
-			pygame.display.update(area)
+		if not self.rendering:
+			pass
+		elif self.dirty_rect_mode:
+			self._update_dirty_rects()
 		else:
+			if area is not None:
+				pygame.display.update(area)
+			else:
+				pygame.display.update()
+			self.SCREEN.blit(self.BLACK_SCREEN, (0, 0))
+
+	def _update_dirty_rects(self):
+		"""
+		Updates the screen in dirty-rect mode, see self.set_dirty_rect_mode().
+		"""
+		# Update what was drawn on in this frame, and what was cleaned up after the last frame:
+		if self._full_update:
 			pygame.display.update()
-		self.SCREEN.blit(self.BLACK_SCREEN, (0, 0))
+		else:
+			pygame.display.update(self._dirty_rects + self._last_dirty_rects)
+		# Clean up what was drawn on in this frame using the background:
+		for rect in self._dirty_rects:
+			self.SCREEN.blit(self.BACKGROUND, rect, rect)
+
+		self._last_dirty_rects = self._dirty_rects
+		self._dirty_rects = []
+		self._full_update = False
 
 	def get_screen(self):
 		return self.SCREEN
\ No newline at end of file
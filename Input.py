@@ -1,46 +1,251 @@
+import struct
+import zlib
+
 from globals import pygame
 from EngineController import *
 
 
+class KeyStates(object):
+	"""
+	The state of every key in one integer: Every key has its own byte (the index of the key, see Input.get_key_index()),
+	which is 1 if the key is in that state, else 0. So the states of all keys are combined with single operations,
+	e.g. keys pressed in this frame but not in the last one: pressed & ~last_pressed.
+
+	Can be read like the list pygame.key.get_pressed(), e.g. "if key_states[K_RIGHT]".
+	"""
+
+	def __init__(self, input_engine):
+		self._input = input_engine
+		self.bits = 0
+
+	def __getitem__(self, key):
+		return (self.bits >> (self._input.get_key_index(key) << 3)) & 1
+
+	def __len__(self):
+		return self._input.key_amount
+
+
+class InputRecording(object):
+	"""
+	The input of every frame (events, pressed keys, focus), as read by Input.update(). Recorded input can be saved
+	to a file and replayed later, so e.g. the same run through a level can be benchmarked after every change
+	(see Input.start_recording() and Input.start_replay()).
+
+	Only the events the game uses are recorded (keys pushed or released, quit). The file is zlib-compressed and
+	the pressed keys are only stored in frames they changed in.
+	"""
+
+	magic = b"WL3I"
+	version = 1
+	header = struct.Struct("<4sHI")  # Magic, version, amount of frames
+	frame_header = struct.Struct("<BHH")  # Flags (1: focused, 2: pressed keys changed), size of pressed keys, events
+	event_struct = struct.Struct("<BiHH")  # Type (index in event_types), key, mod, scancode
+	event_types = (pygame.KEYDOWN, pygame.KEYUP, pygame.QUIT)
+
+	def __init__(self):
+		self.frames = []  # List of (events, pressed keys (see KeyStates), focused)
+
+	def add_frame(self, events, pressed, focused):
+		"""
+		Records the input of a frame. Events the game doesn't use are ignored.
+		"""
+		self.frames.append(([event for event in events if event.type in self.event_types], pressed, focused))
+
+	def save(self, path):
+		"""
+		Saves the recording to a file.
+		:param path: The path of the file
+		:return: None
+		"""
+		data = bytearray()
+		last_pressed = 0
+		for events, pressed, focused in self.frames:
+			pressed_bytes = pressed.to_bytes((pressed.bit_length() + 7) // 8, "little") if pressed != last_pressed else b""
+			flags = (1 if focused else 0) | (2 if pressed != last_pressed else 0)
+			data += self.frame_header.pack(flags, len(pressed_bytes), len(events))
+			data += pressed_bytes
+			for event in events:
+				data += self.event_struct.pack(self.event_types.index(event.type), getattr(event, "key", 0),
+											   getattr(event, "mod", 0), getattr(event, "scancode", 0))
+			last_pressed = pressed
+
+		with open(path, "wb") as recording_file:
+			recording_file.write(self.header.pack(self.magic, self.version, len(self.frames)))
+			recording_file.write(zlib.compress(bytes(data), 9))
+
+	@classmethod
+	def load(cls, path):
+		"""
+		Loads a recording saved by save().
+		:param path: The path of the file
+		:return: The InputRecording
+		"""
+		with open(path, "rb") as recording_file:
+			magic, version, frame_amount = cls.header.unpack(recording_file.read(cls.header.size))
+			assert magic == cls.magic and version == cls.version, "%s is no input-recording." % path
+			data = zlib.decompress(recording_file.read())
+
+		recording = cls()
+		offset = 0
+		pressed = 0
+		for frame in range(frame_amount):
+			flags, pressed_size, event_amount = cls.frame_header.unpack_from(data, offset)
+			offset += cls.frame_header.size
+			if flags & 2:
+				pressed = int.from_bytes(data[offset:offset+pressed_size], "little")
+				offset += pressed_size
+			events = []
+			for event in range(event_amount):
+				event_type, key, mod, scancode = cls.event_struct.unpack_from(data, offset)
+				offset += cls.event_struct.size
+				if cls.event_types[event_type] == pygame.QUIT:
+					events.append(pygame.event.Event(pygame.QUIT))
+				else:
+					events.append(pygame.event.Event(cls.event_types[event_type], key=key, mod=mod, scancode=scancode,
+													 unicode=""))
+			recording.frames.append((events, pressed, bool(flags & 1)))
+		return recording
+
+
 class Input(EngineController):
 	def __init__(self, engine):
 		"""
 		Handles user-Input. Should only be instanced by the main-engine.
+		The states of the keys are updated once per frame, and can be read like lists, e.g. "if pressed_keys[K_RIGHT]":
+		-pressed_keys: Keys that are pressed
+		-keydown_events: Keys that were pushed in this frame
+		-keyup_events: Keys that were released in this frame
+		-smoothkeys: Keys that were pressed in any of the last self.smooth_frames frames
 		:param engine: The complete engine
 		"""
 		super(Input, self).__init__(engine)
 		self.events = pygame.event.get() # Get pygame.events the first time
-		self.keydown_events = {} # Create list for keydown events - a event can be checked e.g. "if keydown_events[K_RIGHT]"
-		self.pressed_keys = pygame.key.get_pressed() # Get pressed keys the first time
 		self.focused_keys = pygame.key.get_focused() # Get focused keys the first time
-		self.smoothkeys = [] # Create a list where the smoothkeys will be stored.
-		self.__keyslist = [pygame.key.get_pressed() for i in range(4)]
+		self.smooth_frames = 4 # Amount of frames keys stay in self.smoothkeys
+
+		# The index of every key (keycode) in the KeyStates, see self.get_key_index():
+		pressed = pygame.key.get_pressed()
+		self.key_amount = len(pressed)
+		self._key_indexes = {}
+		# pygame 2 has more keycodes than keys, so the keycodes are mapped to the index of their key (the scancode),
+		# pygame 1 uses the keycodes as index:
+		scancode_wrapper = getattr(pygame.key, "ScancodeWrapper", None)
+		self._index_lookup = scancode_wrapper(range(self.key_amount)) if scancode_wrapper else range(self.key_amount)
+
+		self.pressed_keys = KeyStates(self) # Keys pressed in this frame
+		self.keydown_events = KeyStates(self) # Keys pushed in this frame - a event can be checked e.g. "if keydown_events[K_RIGHT]"
+		self.keyup_events = KeyStates(self) # Keys released in this frame
+		self.smoothkeys = KeyStates(self) # Keys pressed in one of the last frames
+		self.pressed_keys.bits = self._to_bits(pressed)
+		self.__keyslist = [self.pressed_keys.bits] * self.smooth_frames
+
+		# Recording and replaying, see self.start_recording() and self.start_replay():
+		self._recording = None
+		self._replay = None
+		self._replay_frame = 0
+
+	@staticmethod
+	def _to_bits(pressed):
+		"""
+		Converts the list of pressed keys (see pygame.key.get_pressed()) into the integer used by KeyStates.
+		"""
+		return int.from_bytes(bytes(pressed), "little")
+
+	def get_key_index(self, key):
+		"""
+		Returns the index of a key (keycode, e.g. K_RIGHT) in pygame.key.get_pressed() and in KeyStates.
+		"""
+		try:
+			return self._key_indexes[key]
+		except KeyError:
+			self._key_indexes[key] = self._index_lookup[key]
+			return self._key_indexes[key]
+
+	def start_recording(self):
+		"""
+		Starts recording the input of every frame, until stop_recording() is called.
+		:return: The InputRecording
+		"""
+		self._recording = InputRecording()
+		return self._recording
+
+	def stop_recording(self, path=None):
+		"""
+		Stops recording the input.
+		:param path: If given, the recording is saved to this file
+		:return: The InputRecording
+		"""
+		recording, self._recording = self._recording, None
+		if path is not None:
+			recording.save(path)
+		return recording
+
+	def start_replay(self, recording):
+		"""
+		Replays recorded input instead of the input of the user, starting with the next frame. When the recording
+		is over, the input of the user is used again. Only quitting the game still works while replaying.
+		:param recording: An InputRecording or the path of a recording saved before
+		:return: None
+		"""
+		self._replay = InputRecording.load(recording) if type(recording) is str else recording
+		self._replay_frame = 0
+
+	def is_replaying(self):
+		"""
+		Returns True if recorded input is replayed at the moment.
+		"""
+		return self._replay is not None
+
+	def _read_replay(self):
+		"""
+		Returns the events, pressed keys and focus of the next frame of the replay.
+		"""
+		events, pressed, focused = self._replay.frames[self._replay_frame]
+		# Still get the events of the user, so the window keeps responding and can be closed:
+		events = events + [event for event in pygame.event.get() if event.type == pygame.QUIT]
+		self._replay_frame += 1
+		if self._replay_frame >= len(self._replay.frames):
+			self._replay = None
+		return events, pressed, focused
 
 	def update(self):
 		"""
 		Updates self.events, self.pressed_keys and self.focussed_keys and self.smoothkeys.
 		"""
-		self.events = pygame.event.get()
-		self.pressed_keys = pygame.key.get_pressed()
-		self.focused_keys = pygame.key.get_focused()
+		# Read the input, either of the user or of the replay:
+		if self._replay is not None:
+			self.events, pressed, self.focused_keys = self._read_replay()
+		else:
+			self.events = pygame.event.get()
+			self.focused_keys = pygame.key.get_focused()
+			pressed = self._to_bits(pygame.key.get_pressed())
+		# Record it:
+		if self._recording is not None:
+			self._recording.add_frame(self.events, pressed, self.focused_keys)
+
+		last_pressed = self.pressed_keys.bits
+		self.pressed_keys.bits = pressed
 
-		self.keydown_events = {i: False for i in range(200)}
-		self.keyup_events = self.keydown_events
+		# Keys pushed and released in this frame. The events are used as well, so keys pushed and released again
+		# within one frame aren't missed:
+		down = pressed & ~last_pressed
+		up = last_pressed & ~pressed
 		for event in self.events:
 			if event.type == pygame.KEYDOWN:
-				self.keydown_events[event.key] = True
+				down |= 1 << (self.get_key_index(event.key) << 3)
 			elif event.type == pygame.KEYUP:
-				self.keyup_events[event.key] = False
+				up |= 1 << (self.get_key_index(event.key) << 3)
+		self.keydown_events.bits = down
+		self.keyup_events.bits = up
 
 		#####
 		# Update self.smoothkeys:
 		# Add another keylist to the stack:
 		self.__keyslist.pop(0)
-		self.__keyslist.append(pygame.key.get_pressed())
-		# Make one single list of those 3 in self.__keylist,
-		# where every element is true if one of the three is true:
-		self.smoothkeys = [0 for i in self.__keyslist[0]]
-		for keylist in self.__keyslist:
-			for key in range(len(keylist)):
-				if keylist[key]:
-					self.smoothkeys[key] = 1
+		self.__keyslist.append(pressed)
+		# Make one single state of those in self.__keylist,
+		# where every key is pressed if it is pressed in one of them:
+		smooth = 0
+		for keys in self.__keyslist:
+			smooth |= keys
+		self.smoothkeys.bits = smooth
@@ -0,0 +1,318 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+
+class Level(object):
+	"""
+	Everything needed to build a level, independent of where it comes from (tmx-file or compiled level).
+	See Engine._parse_tmx() and Engine._build_level().
+	"""
+
+	def __init__(self):
+		self.grid_size = (1, 1)  # Size of grid in amount of tiles
+		self.tile_size = (1, 1)  # Size of indiv. tiles
+		self.tile_properties = []  # List of (tile_id, property_name, property_value)
+		self.tile_animations = []  # List of (tile_id, [(tile_id, duration in milliseconds), ...])
+		self.layers = []  # array("I") of tile-types for every layer (tile-id + 1, 0 for empty tiles)
+		self.actors = []  # List of (actor_type, (x, y)), the game-actors to spawn
+		self.chunked_layers = None  # ChunkedLayers instead of self.layers, if the level is streamed
+
+
+class ChunkedLayers(object):
+	"""
+	The layers of a level split into chunks of chunk_size tiles, every chunk compressed on its own, so single chunks
+	can be read without reading the whole level (see Streaming.ChunkStreamer). Stored next to the tmx-file like
+	compiled levels, e.g. "Forest_N1_1.tmx.wl3s", see LevelCache.save_chunked().
+
+	Chunks at the right and bottom border are filled up with empty tiles, so every chunk has the same size.
+	Chunks without any tile aren't stored at all. Can be read from multiple threads.
+	"""
+
+	magic = b"WL3S"
+	version = 1
+	# Header: magic, version, modification-time, size and sha1 of tmx-file (see LevelCache), grid-size, chunk-size,
+	# amount of layers:
+	header = struct.Struct("<4sHQQ20sIIIII")
+	# Entry of the table after the header, one per chunk and layer: offset in the file, compressed size (0: empty)
+	entry = struct.Struct("<QI")
+
+	def __init__(self, path):
+		"""
+		Opens a file saved by write(). Only the header and the table are read, the chunks are read when needed.
+		:param path: The path of the file
+		"""
+		self._file = open(path, "rb")
+		self._lock = threading.Lock()  # Reading a chunk means seeking and reading, which must not be interrupted
+		(magic, version, self.tmx_mtime, self.tmx_size, self.tmx_sha1, grid_width, grid_height, chunk_width,
+		 chunk_height, self.layer_amount) = self.header.unpack(self._file.read(self.header.size))
+		assert magic == self.magic and version == self.version, "%s is no chunked level." % path
+		self.grid_size = (grid_width, grid_height)
+		self.chunk_size = (chunk_width, chunk_height)
+		# Size of the grid in chunks:
+		self.chunk_grid_size = (-(-grid_width // chunk_width), -(-grid_height // chunk_height))
+		# The table stays packed, entries are unpacked when their chunk is read:
+		self._table = self._file.read(self.entry.size * self.layer_amount *
+									  self.chunk_grid_size[0] * self.chunk_grid_size[1])
+
+	def close(self):
+		with self._lock:
+			self._file.close()
+
+	def read_chunk(self, layer, chunk):
+		"""
+		Reads the tiles of a chunk of a layer.
+		:param layer: The index of the layer
+		:param chunk: The position of the chunk (in chunks)
+		:return: array("I") with the type of every tile of the chunk (see Level.layers), row by row
+		"""
+		entry_index = (chunk[1]*self.chunk_grid_size[0] + chunk[0])*self.layer_amount + layer
+		offset, size = self.entry.unpack_from(self._table, entry_index*self.entry.size)
+		if not size:
+			return array("I", [0]) * (self.chunk_size[0]*self.chunk_size[1])
+		with self._lock:
+			self._file.seek(offset)
+			data = self._file.read(size)
+		tile_types = array("I")
+		tile_types.frombytes(zlib.decompress(data))
+		# Arrays are stored little-endian:
+		if sys.byteorder == "big":
+			tile_types.byteswap()
+		return tile_types
+
+	@classmethod
+	def write(cls, path, tmx_info, grid_size, layers, chunk_size):
+		"""
+		Splits layers into chunks and saves them.
+		:param path: The path of the file
+		:param tmx_info: (modification-time, size, sha1) of the tmx-file the layers are from
+		:param grid_size: Size of grid in tiles
+		:param layers: array("I") of tile-types for every layer, see Level.layers
+		:param chunk_size: Size of the chunks in tiles
+		:return: None
+		"""
+		chunk_grid_size = (-(-grid_size[0] // chunk_size[0]), -(-grid_size[1] // chunk_size[1]))
+		empty_row = array("I", [0]) * chunk_size[0]
+		table = bytearray()
+		chunks_data = []
+		offset = cls.header.size + cls.entry.size * len(layers) * chunk_grid_size[0] * chunk_grid_size[1]
+		for chunk_y in range(chunk_grid_size[1]):
+			for chunk_x in range(chunk_grid_size[0]):
+				left = chunk_x*chunk_size[0]
+				right = min(left + chunk_size[0], grid_size[0])
+				for layer in layers:
+					# Copy the rows of the chunk, filled up with empty tiles:
+					tile_types = array("I")
+					for y in range(chunk_y*chunk_size[1], (chunk_y+1)*chunk_size[1]):
+						if y < grid_size[1]:
+							tile_types.extend(layer[y*grid_size[0]+left:y*grid_size[0]+right])
+							tile_types.extend(empty_row[:chunk_size[0]-(right-left)])
+						else:
+							tile_types.extend(empty_row)
+					# Empty chunks aren't stored:
+					if not any(tile_types):
+						table += cls.entry.pack(0, 0)
+						continue
+					if sys.byteorder == "big":
+						tile_types.byteswap()
+					data = zlib.compress(tile_types.tobytes())
+					table += cls.entry.pack(offset, len(data))
+					chunks_data.append(data)
+					offset += len(data)
+
+		with open(path, "wb") as chunk_file:
+			chunk_file.write(cls.header.pack(cls.magic, cls.version, tmx_info[0], tmx_info[1], tmx_info[2], grid_size[0],
+											 grid_size[1], chunk_size[0], chunk_size[1], len(layers)))
+			chunk_file.write(table)
+			for data in chunks_data:
+				chunk_file.write(data)
+
+
+class LevelCache(object):
+	"""
+	Stores levels compiled from tmx-files next to them (e.g. "Forest_N1_1.tmx.wl3c"), so they can be loaded again
+	without parsing any xml. The layers are stored as raw arrays, so loading them is nothing more than copying memory.
+
+	A compiled level is only used as long as its tmx-file didn't change: If modification-time or size differ,
+	the content of the tmx-file is hashed and compared to the hash the level was compiled from.
+
+	For streamed levels, the layers are also stored in chunks (e.g. "Forest_N1_1.tmx.wl3s"), see ChunkedLayers.
+	"""
+
+	extension = ".wl3c"
+	chunked_extension = ".wl3s"
+	magic = b"WL3C"
+	version = 1
+	# Header: magic, version, modification-time of tmx-file (ns), size of tmx-file, sha1 of tmx-file, size of meta
+	header = struct.Struct("<4sHQQ20sI")
+
+	def __init__(self, log_level=logging.ERROR):
+		# Create logger
+		self.logger = logging.getLogger("Level Cache")
+		self.logger.setLevel(log_level)
+
+	def get_cache_path(self, tmx_path):
+		"""
+		Returns the path of the compiled level of a tmx-file.
+		"""
+		return tmx_path + self.extension
+
+	@staticmethod
+	def _hash_file(path):
+		with open(path, "rb") as tmx_file:
+			return hashlib.sha1(tmx_file.read()).digest()
+
+	def _is_up_to_date(self, tmx_path, mtime, size, sha1):
+		"""
+		Returns True if the tmx-file didn't change since it was compiled.
+		"""
+		tmx_stat = os.stat(tmx_path)
+		return (tmx_stat.st_mtime_ns, tmx_stat.st_size) == (mtime, size) or self._hash_file(tmx_path) == sha1
+
+	def load(self, tmx_path, load_layers=True):
+		"""
+		Loads the compiled level of a tmx-file.
+		:param tmx_path: The path of the tmx-file
+		:param load_layers: False to leave the layers out, e.g. if they're streamed (see self.load_chunked())
+		:return: The Level, or None if there's no compiled level or it's outdated or broken
+		"""
+		cache_path = self.get_cache_path(tmx_path)
+		if not os.path.exists(cache_path):
+			return None
+
+		try:
+			with open(cache_path, "rb") as cache_file:
+				if load_layers:
+					data = cache_file.read()
+				else:
+					data = cache_file.read(self.header.size)
+			magic, version, mtime, size, sha1, meta_size = self.header.unpack_from(data)
+			if magic != self.magic or version != self.version:
+				return None
+
+			# Make sure the tmx-file didn't change since it was compiled:
+			if not self._is_up_to_date(tmx_path, mtime, size, sha1):
+				self.logger.debug("Compiled level %s is outdated." % cache_path)
+				return None
+			# Without the layers, only the meta-data is needed:
+			if not load_layers:
+				with open(cache_path, "rb") as cache_file:
+					data = cache_file.read(self.header.size + meta_size)
+
+			# Read the meta-data:
+			offset = self.header.size
+			meta = json.loads(data[offset:offset+meta_size].decode("utf-8"))
+			offset += meta_size
+
+			level = Level()
+			level.grid_size = tuple(meta["grid_size"])
+			level.tile_size = tuple(meta["tile_size"])
+			level.tile_properties = [tuple(tile_property) for tile_property in meta["tile_properties"]]
+			level.tile_animations = [(tile_id, [tuple(frame) for frame in frames]) for tile_id, frames in meta["tile_animations"]]
+			level.actors = [(actor_type, tuple(position)) for actor_type, position in meta["actors"]]
+
+			# Copy the layers:
+			data = memoryview(data)
+			for layer_size in meta["layer_sizes"] if load_layers else ():
+				layer = array("I")
+				layer.frombytes(data[offset:offset+layer_size*layer.itemsize])
+				# Arrays are stored little-endian:
+				if sys.byteorder == "big":
+					layer.byteswap()
+				level.layers.append(layer)
+				offset += layer_size*layer.itemsize
+			assert offset == len(data) or not load_layers, "Compiled level has the wrong size."
+
+		except Exception as error:
+			self.logger.warning("Couldn't load compiled level %s: %s" % (cache_path, error))
+			return None
+
+		self.logger.debug("Loaded compiled level %s." % cache_path)
+		return level
+
+	def save(self, tmx_path, level):
+		"""
+		Compiles a level and stores it next to its tmx-file.
+		:param tmx_path: The path of the tmx-file the level was parsed from
+		:param level: The Level
+		:return: True if it worked, False if not (e.g. because the directory is read-only)
+		"""
+		cache_path = self.get_cache_path(tmx_path)
+		meta = json.dumps({"grid_size": level.grid_size,
+						   "tile_size": level.tile_size,
+						   "tile_properties": level.tile_properties,
+						   "tile_animations": level.tile_animations,
+						   "actors": level.actors,
+						   "layer_sizes": [len(layer) for layer in level.layers]}).encode("utf-8")
+
+		try:
+			tmx_stat = os.stat(tmx_path)
+			# Write into a temporary file first, so a half written file is never loaded:
+			with open(cache_path + ".tmp", "wb") as cache_file:
+				cache_file.write(self.header.pack(self.magic, self.version, tmx_stat.st_mtime_ns, tmx_stat.st_size,
+												  self._hash_file(tmx_path), len(meta)))
+				cache_file.write(meta)
+				for layer in level.layers:
+					# Arrays are stored little-endian:
+					if sys.byteorder == "big":
+						layer = array("I", layer)
+						layer.byteswap()
+					cache_file.write(layer.tobytes())
+			os.replace(cache_path + ".tmp", cache_path)
+
+		except (IOError, OSError) as error:
+			self.logger.warning("Couldn't save compiled level %s: %s" % (cache_path, error))
+			return False
+
+		self.logger.debug("Saved compiled level %s." % cache_path)
+		return True
+
+	def load_chunked(self, tmx_path):
+		"""
+		Opens the layers of a tmx-file stored in chunks, see self.save_chunked().
+		:param tmx_path: The path of the tmx-file
+		:return: The ChunkedLayers, or None if they don't exist or are outdated or broken
+		"""
+		chunked_path = tmx_path + self.chunked_extension
+		if not os.path.exists(chunked_path):
+			return None
+
+		try:
+			chunked_layers = ChunkedLayers(chunked_path)
+		except Exception as error:
+			self.logger.warning("Couldn't load chunked level %s: %s" % (chunked_path, error))
+			return None
+		if not self._is_up_to_date(tmx_path, chunked_layers.tmx_mtime, chunked_layers.tmx_size, chunked_layers.tmx_sha1):
+			self.logger.debug("Chunked level %s is outdated." % chunked_path)
+			chunked_layers.close()
+			return None
+		return chunked_layers
+
+	def save_chunked(self, tmx_path, level, chunk_size=(64, 64)):
+		"""
+		Stores the layers of a level in chunks next to its tmx-file, so they can be streamed (see ChunkedLayers).
+		:param tmx_path: The path of the tmx-file the level was parsed from
+		:param level: The Level, with its layers
+		:param chunk_size: The size of the chunks in tiles
+		:return: True if it worked, False if not (e.g. because the directory is read-only)
+		"""
+		chunked_path = tmx_path + self.chunked_extension
+		try:
+			tmx_stat = os.stat(tmx_path)
+			# Write into a temporary file first, so a half written file is never loaded:
+			ChunkedLayers.write(chunked_path + ".tmp", (tmx_stat.st_mtime_ns, tmx_stat.st_size, self._hash_file(tmx_path)),
+								level.grid_size, level.layers, chunk_size)
+			os.replace(chunked_path + ".tmp", chunked_path)
+
+		except (IOError, OSError) as error:
+			self.logger.warning("Couldn't save chunked level %s: %s" % (chunked_path, error))
+			return False
+
+		self.logger.debug("Saved chunked level %s." % chunked_path)
+		return True
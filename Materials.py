@@ -0,0 +1,96 @@
+class Materials:
+	"""
+	Bits of the known material groups (see Tiles.BaseTile for what they mean).
+	Material groups are combined into masks with |, so checking if a tile has one of multiple
+	material groups is a single &, e.g. "if tile.get_material_mask() & Materials.COLLIDING".
+	"""
+	EMPTY = 0
+	DECO = 1 << 0
+
+	SOLID = 1 << 1
+
+	SOFT_BREAK = 1 << 2
+	HARD_BREAK = 1 << 3
+	SHOT_BREAK = 1 << 4
+	FIRE_BREAK = 1 << 5
+
+	LADDER = 1 << 6
+
+	WATER_STILL = 1 << 7
+	WATER_LEFT = 1 << 8
+	WATER_RIGHT = 1 << 9
+	WATER_UP = 1 << 10
+	WATER_DOWN = 1 << 11
+	WATER_IMPERVIOUS = 1 << 12
+
+	PLATFORM_FALLTHROUGH = 1 << 13
+
+	# Material groups average game-actors collide with:
+	COLLIDING = SOLID | SOFT_BREAK | HARD_BREAK | SHOT_BREAK | FIRE_BREAK
+
+
+class MaterialRegistry(object):
+	"""
+	Maps the names of material groups, as they're used in the property "material_group" of the tmx-file,
+	to bits in an integer mask. Known material groups always get the bits defined in Materials,
+	unknown ones get the next free bit the first time they're seen.
+	"""
+
+	# Masks are stored in arrays of unsigned 32-bit integers, see World:
+	max_bits = 32
+
+	def __init__(self):
+		self._masks = {"empty": Materials.EMPTY,
+					   "deco": Materials.DECO,
+					   "solid": Materials.SOLID,
+					   "soft-break": Materials.SOFT_BREAK,
+					   "hard-break": Materials.HARD_BREAK,
+					   "shot-break": Materials.SHOT_BREAK,
+					   "fire-break": Materials.FIRE_BREAK,
+					   "ladder": Materials.LADDER,
+					   "water-still": Materials.WATER_STILL,
+					   "water-left": Materials.WATER_LEFT,
+					   "water-right": Materials.WATER_RIGHT,
+					   "water-up": Materials.WATER_UP,
+					   "water-down": Materials.WATER_DOWN,
+					   "water-impervious": Materials.WATER_IMPERVIOUS,
+					   "platform-fallthrough": Materials.PLATFORM_FALLTHROUGH}
+		# The next bit that is handed out to an unknown material group:
+		self._next_bit = max(self._masks.values()).bit_length()
+
+	def register(self, material_group):
+		"""
+		Gives a material group its own bit if it doesn't already have one.
+		:param material_group: The name of the material group, e.g. "solid"
+		:return: The mask of the material group
+		"""
+		if material_group not in self._masks:
+			assert self._next_bit < self.max_bits, "Too many material groups, no bit left for \"%s\"." % material_group
+			self._masks[material_group] = 1 << self._next_bit
+			self._next_bit += 1
+		return self._masks[material_group]
+
+	def get_mask(self, material_group):
+		"""
+		Returns the mask of a material group or of multiple material groups.
+		:param material_group: A mask (int), the name of a material group or a list of names
+		:return: The mask
+		"""
+		# Masks are returned unchanged:
+		if type(material_group) is int:
+			return material_group
+		# Combine the bits of multiple material groups:
+		if type(material_group) is list:
+			mask = 0
+			for name in material_group:
+				mask |= self.register(name)
+			return mask
+		return self.register(material_group)
+
+	def get_material_groups(self, mask):
+		"""
+		Returns the names of all material groups contained in a mask. Useful for debugging.
+		:param mask: The mask
+		:return: List of names of material groups
+		"""
+		return [name for name, bit in self._masks.items() if bit & mask]
@@ -0,0 +1,243 @@
+try:
+	import numpy
+except ImportError:
+	# Optional: Without numpy, every component moves its game-actor itself
+	numpy = None
+
+from EngineController import *
+
+
+class PhysicsSystem(EngineController):
+	"""
+	Applies gravity and velocity to all game-actors at once, using numpy-arrays instead of one python-call per
+	game-actor (see GeneralComponents.GravityComponent and ApplyVelocityComponent):
+	-Before the game-actors are updated, gravity is added to every velocity and the fall-speed is clamped
+	-After they were updated, every velocity is applied, keeping the sub-pixel fractions, and the rects are moved
+
+	The components register themselves the first time they're updated, and do the work themselves while the system is
+	disabled (e.g. if numpy isn't installed). The results are the same either way.
+
+	Every registered component gets a row of the arrays, which are kept between frames: The components write their
+	velocity into it whenever it changes (see self.set_velocity() and self.set_fall_speed()), and only the game-actors
+	that accelerate or move by at least one pixel are touched by python. The rows of removed components are reused.
+
+	Only the game-actors updated in a frame are moved, the others are suspended (see self.set_active_actors()).
+	"""
+
+	def __init__(self, engine):
+		super(PhysicsSystem, self).__init__(engine)
+		self.enabled = numpy is not None
+		self.clear()
+
+	def set_enabled(self, enabled):
+		"""
+		Turns the batched physics on or off. If numpy isn't installed, it stays off.
+		:param enabled: True to turn it on, False to turn it off
+		:return: None
+		"""
+		enabled = enabled and numpy is not None
+		# The sub-pixel fractions are kept by whoever applies the velocity, so they're handed over:
+		if self.enabled and not enabled:
+			for row, body in enumerate(self._velocity_bodies):
+				if body is not None:
+					body[1]._tmp_velocity_frac = self._fractions[row].tolist()
+		elif enabled and not self.enabled:
+			for row, body in enumerate(self._velocity_bodies):
+				if body is not None:
+					self._fractions[row] = body[1]._tmp_velocity_frac
+			# Nothing was accelerated while it was off:
+			if self._accelerated is not None:
+				self._accelerated[:] = False
+		self.enabled = enabled
+
+	def clear(self):
+		"""
+		Forgets every registered component, e.g. when a new level is loaded.
+		"""
+		# The gravity-components, as (game-actor, component) per row, None for unused rows:
+		self._gravity_bodies = []
+		self._free_gravity_rows = []
+		self._gravity_used = None  # True for the rows in use
+		self._gravity_active = None  # True for the rows of active game-actors, see self.set_active_actors()
+		self._gravity = None  # (g, max_fall_speed) per row
+		self._fall_speeds = None  # The vertical velocity per row
+		self._accelerated = None  # True for the rows accelerated by the last self.apply_gravity()
+		# The apply-velocity-components, as (game-actor, component) per row, None for unused rows:
+		self._velocity_bodies = []
+		self._free_velocity_rows = []
+		self._velocity_used = None  # True for the rows in use
+		self._velocity_active = None  # True for the rows of active game-actors, see self.set_active_actors()
+		self._velocities = None  # The velocity per row
+		self._fractions = None  # The sub-pixel fractions per row
+		# The rows of the components of every game-actor, as actor-id: list of (bodies, row):
+		self._actor_rows = {}
+
+	@staticmethod
+	def _grow(array, length, shape=(), dtype=float):
+		"""
+		Returns the array with at least length rows, the new rows are zeros. It's grown to (at least) twice its size,
+		so it's rarely copied.
+		:param array: The array, None if there is none yet
+		:param shape: The shape of a row
+		"""
+		old_length = 0 if array is None else len(array)
+		if old_length >= length:
+			return array
+		grown_array = numpy.zeros((max(length, 2*old_length, 16),) + shape, dtype=dtype)
+		if array is not None:
+			grown_array[:old_length] = array
+		return grown_array
+
+	def _add_body(self, bodies, free_rows, game_actor, component):
+		"""
+		Gives a component a row, reusing one of a removed component if possible.
+		:return: The row
+		"""
+		if free_rows:
+			row = free_rows.pop()
+			bodies[row] = (game_actor, component)
+		else:
+			row = len(bodies)
+			bodies.append((game_actor, component))
+		self._actor_rows.setdefault(id(game_actor), []).append((bodies, row))
+		component.physics_row = row
+		return row
+
+	def add_gravity(self, game_actor, component):
+		"""
+		Registers a GravityComponent, so its gravity is added by self.apply_gravity() from now on.
+		g and max_fall_speed of the component are read once, when it's registered.
+		"""
+		row = self._add_body(self._gravity_bodies, self._free_gravity_rows, game_actor, component)
+		length = len(self._gravity_bodies)
+		self._gravity_used = self._grow(self._gravity_used, length, dtype=bool)
+		self._gravity_active = self._grow(self._gravity_active, length, dtype=bool)
+		self._gravity = self._grow(self._gravity, length, (2,))
+		self._fall_speeds = self._grow(self._fall_speeds, length)
+		self._accelerated = self._grow(self._accelerated, length, dtype=bool)
+
+		self._gravity_used[row] = True
+		# It's registered while its game-actor is updated, so it's active:
+		self._gravity_active[row] = True
+		self._gravity[row] = component.g, component.max_fall_speed
+		self._fall_speeds[row] = component.velocity[1]
+		self._accelerated[row] = False
+
+	def add_velocity(self, game_actor, component):
+		"""
+		Registers an ApplyVelocityComponent, so the game-actor is moved by self.apply_velocity() from now on.
+		"""
+		row = self._add_body(self._velocity_bodies, self._free_velocity_rows, game_actor, component)
+		length = len(self._velocity_bodies)
+		self._velocity_used = self._grow(self._velocity_used, length, dtype=bool)
+		self._velocity_active = self._grow(self._velocity_active, length, dtype=bool)
+		self._velocities = self._grow(self._velocities, length, (2,))
+		self._fractions = self._grow(self._fractions, length, (2,))
+
+		self._velocity_used[row] = True
+		self._velocity_active[row] = True
+		self._velocities[row] = component.velocity
+		self._fractions[row] = component._tmp_velocity_frac
+
+	def remove_actor(self, game_actor):
+		"""
+		Unregisters every component of a game-actor, e.g. when it's deleted. Its rows are reused by the next ones.
+		"""
+		for bodies, row in self._actor_rows.pop(id(game_actor), ()):
+			component = bodies[row][1]
+			bodies[row] = None
+			if bodies is self._gravity_bodies:
+				self._gravity_used[row] = False
+				self._gravity_active[row] = False
+				self._free_gravity_rows.append(row)
+			else:
+				# The component keeps its fractions, in case it's used without the batched physics again:
+				component._tmp_velocity_frac = self._fractions[row].tolist()
+				self._velocity_used[row] = False
+				self._velocity_active[row] = False
+				self._free_velocity_rows.append(row)
+			component.physics_row = None
+
+	def set_active_actors(self, active_actors):
+		"""
+		Sets the game-actors updated in this frame. Only they are moved, the others keep their position, velocity and
+		fractions until they're active again (e.g. the ones suspended far away from the screen, see
+		GameActorController). Called once per frame, before self.apply_gravity().
+		:param active_actors: List of (actor-id, game-actor), or None if every game-actor is active
+		:return: None
+		"""
+		for bodies, used, active in ((self._gravity_bodies, self._gravity_used, self._gravity_active),
+									 (self._velocity_bodies, self._velocity_used, self._velocity_active)):
+			if not bodies:
+				continue
+			if active_actors is None:
+				active[:] = used
+			else:
+				active[:] = False
+				active[[row for actor_id, actor in active_actors
+						for row_bodies, row in self._actor_rows.get(actor_id, ()) if row_bodies is bodies]] = True
+
+	def set_fall_speed(self, row, fall_speed):
+		"""
+		Called by a registered GravityComponent whenever its vertical velocity changed.
+		"""
+		self._fall_speeds[row] = fall_speed
+
+	def set_velocity(self, row, velocity):
+		"""
+		Called by a registered ApplyVelocityComponent whenever its velocity changed.
+		"""
+		self._velocities[row] = velocity
+
+	def get_acceleration(self, row):
+		"""
+		Returns the vertical velocity of a GravityComponent if the last self.apply_gravity() accelerated it,
+		otherwise None.
+		"""
+		if self._accelerated[row]:
+			return float(self._fall_speeds[row])
+		return None
+
+	def apply_gravity(self):
+		"""
+		Adds gravity to the velocity of every registered GravityComponent that doesn't fall at full speed yet.
+		The components send the new velocity to the others when they're updated (see self.get_acceleration()).
+		"""
+		if not (self.enabled and self._gravity_bodies):
+			return
+		length = len(self._gravity_bodies)
+		fall_speeds = self._fall_speeds[:length]
+		# Only the ones that don't exceed the maximum fall-speed accelerate:
+		accelerated = self._accelerated[:length]
+		numpy.less_equal(fall_speeds, self._gravity[:length, 1], out=accelerated)
+		accelerated &= self._gravity_active[:length]
+		numpy.add(fall_speeds, self._gravity[:length, 0], out=fall_speeds, where=accelerated)
+
+	def apply_velocity(self):
+		"""
+		Moves the game-actor of every registered ApplyVelocityComponent by its velocity. Pygame-rects only move full
+		pixels, so the fractions are summed up until they make one (see ApplyVelocityComponent).
+		:return: A list of the game-actors that moved
+		"""
+		if not (self.enabled and self._velocity_bodies):
+			return []
+		length = len(self._velocity_bodies)
+		velocities = self._velocities[:length]
+		active = self._velocity_active[:length]
+		# Sign, with 0 counting as positive:
+		signs = numpy.where(velocities >= 0, 1., -1.)
+		# Sum up the fractions, a full pixel increases the movement by one:
+		fractions = self._fractions[:length] + numpy.abs(velocities) % 1 * signs
+		movements = velocities + (fractions >= 1) - (fractions <= -1)
+		# The fractions of suspended game-actors don't change:
+		numpy.copyto(self._fractions[:length], numpy.where(fractions >= 0, 1., -1.) * (numpy.abs(fractions) % 1),
+					 where=active[:, None])
+
+		# Move the rects of the active game-actors that move at least one pixel (rects drop the fractions):
+		moving = numpy.flatnonzero((numpy.abs(movements) >= 1).any(axis=1) & active)
+		moved_actors = []
+		for row, movement in zip(moving.tolist(), movements[moving].tolist()):
+			game_actor = self._velocity_bodies[row][0]
+			game_actor.rect.move_ip(movement)
+			moved_actors.append(game_actor)
+		return moved_actors
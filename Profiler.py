@@ -0,0 +1,209 @@
+import csv
+import json
+import time
+from collections import deque
+
+from EngineController import *
+
+
+class FrameProfiler(EngineController):
+	"""
+	Measures how long every part of the engine (see self.sections) takes in every frame. The last frames are kept in
+	a ring buffer and can be shown on the screen (see self.draw_overlay()), or exported as Chrome trace
+	(chrome://tracing, ui.perfetto.dev) or as CSV.
+
+	The engine calls begin_frame() at the beginning of a frame, mark() after each of its parts and end_frame() at its
+	end. While the profiler is disabled, these do nothing.
+	"""
+
+	# The parts of a frame, in the order they run:
+	sections = ("level", "events", "input", "world", "actors", "draw", "graphics", "clock")
+
+	def __init__(self, engine, frame_amount=600):
+		"""
+		:param engine: The complete engine
+		:param frame_amount: The amount of frames kept in the ring buffer
+		"""
+		super(FrameProfiler, self).__init__(engine)
+		self.enabled = False
+		self.show_overlay = False  # True to draw the overlay, see self.draw_overlay()
+		self.budget = 1. / 60  # Frame time (in seconds) that shouldn't be exceeded, the overlay shows it in red
+		# The last frames, as (frame-number, start, [(section, start, duration), ...]):
+		self.frames = deque(maxlen=frame_amount)
+		self._frame_number = 0
+		self._frame_start = 0.
+		self._last_mark = 0.
+		self._marks = []
+		self._start_time = time.perf_counter()  # Times in the exports are relative to this
+
+	def set_enabled(self, enabled):
+		"""
+		Turns the profiler on or off. If it's turned on in the middle of a frame, that frame is measured from now on.
+		:param enabled: True to turn it on, False to turn it off
+		:return: None
+		"""
+		if enabled and not self.enabled:
+			# Otherwise the first mark would count everything since the last frame measured (or the start):
+			self._frame_start = self._last_mark = time.perf_counter()
+		self.enabled = enabled
+		self._marks = []
+
+	def begin_frame(self):
+		"""
+		Starts measuring a frame.
+		"""
+		if self.enabled:
+			self._frame_start = self._last_mark = time.perf_counter()
+			self._marks = []
+
+	def mark(self, section):
+		"""
+		Ends measuring a section: Everything since the last mark (or the beginning of the frame) is counted as part
+		of it. A section can be marked multiple times per frame, e.g. if the game is simulated multiple times.
+		:param section: The name of the section, see self.sections
+		"""
+		if self.enabled:
+			now = time.perf_counter()
+			self._marks.append((section, self._last_mark, now - self._last_mark))
+			self._last_mark = now
+
+	def end_frame(self):
+		"""
+		Stops measuring a frame and saves it to the ring buffer.
+		"""
+		if self.enabled:
+			self.frames.append((self._frame_number, self._frame_start, self._marks))
+			self._frame_number += 1
+			self._marks = []
+
+	def get_section_times(self, frame):
+		"""
+		Returns how long the sections of a frame took.
+		:param frame: A frame of self.frames
+		:return: Dict of section-name: time in seconds
+		"""
+		section_times = dict.fromkeys(self.sections, 0.)
+		for section, start, duration in frame[2]:
+			section_times[section] = section_times.get(section, 0.) + duration
+		return section_times
+
+	def get_averages(self, frame_amount=60):
+		"""
+		Returns how long the sections took on average during the last frames.
+		:param frame_amount: The amount of frames
+		:return: Dict of section-name: time in seconds, plus "total"
+		"""
+		frames = list(self.frames)[-frame_amount:]
+		averages = dict.fromkeys(self.sections + ("total",), 0.)
+		for frame in frames:
+			for section, duration in self.get_section_times(frame).items():
+				averages[section] = averages.get(section, 0.) + duration / len(frames)
+				averages["total"] += duration / len(frames)
+		return averages
+
+	def draw_overlay(self):
+		"""
+		Draws the average times of the last frames onto the screen, if self.show_overlay is True.
+		The total time is red if it exceeds self.budget.
+		"""
+		if not (self.enabled and self.show_overlay and self.frames):
+			return
+		averages = self.get_averages()
+		graphics = self.engine.graphics
+		for line, section in enumerate(self.sections):
+			graphics.draw_text("%-8s %5.2f ms" % (section, 1000. * averages[section]), (4, 4 + 14*line), (225, 225, 225))
+		color = (225, 0, 0) if averages["total"] > self.budget else (0, 225, 0)
+		graphics.draw_text("total    %5.2f ms" % (1000. * averages["total"]), (4, 4 + 14*len(self.sections)), color)
+
+	def export_chrome_trace(self, path):
+		"""
+		Saves the frames of the ring buffer as Chrome trace (JSON), which can be opened in chrome://tracing or
+		ui.perfetto.dev. Every frame and every section is an event.
+		:param path: The path of the file
+		:return: None
+		"""
+		events = []
+		for frame_number, frame_start, marks in self.frames:
+			frame_duration = sum(duration for section, start, duration in marks)
+			events.append({"name": "frame", "ph": "X", "pid": 0, "tid": 0, "args": {"frame": frame_number},
+						   "ts": 1e6 * (frame_start - self._start_time), "dur": 1e6 * frame_duration})
+			for section, start, duration in marks:
+				events.append({"name": section, "ph": "X", "pid": 0, "tid": 0, "args": {"frame": frame_number},
+							   "ts": 1e6 * (start - self._start_time), "dur": 1e6 * duration})
+		with open(path, "w") as trace_file:
+			json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+	def export_csv(self, path):
+		"""
+		Saves the frames of the ring buffer as CSV: One row per frame, with the time (in milliseconds) of every section.
+		:param path: The path of the file
+		:return: None
+		"""
+		with open(path, "w", newline="") as csv_file:
+			writer = csv.writer(csv_file)
+			writer.writerow(("frame", "start_ms", "total_ms") + tuple(section + "_ms" for section in self.sections))
+			for frame in self.frames:
+				section_times = self.get_section_times(frame)
+				writer.writerow([frame[0], "%.3f" % (1000. * (frame[1] - self._start_time)),
+								 "%.3f" % (1000. * sum(section_times.values()))] +
+								["%.3f" % (1000. * section_times[section]) for section in self.sections])
+
+
+class ActorProfiler(object):
+	"""
+	Measures how often and how long the components of the game-actors are updated, summed up per component-class and
+	per actor-type, and counts the messages the components send to each other (see GameActor.send_message()).
+	Everything is summed up until reset() is called.
+
+	Only used by GameActorController.update() while enabled, so it costs nothing otherwise.
+	"""
+
+	def __init__(self):
+		self.enabled = False
+		self.component_stats = {}  # Component-class-name: [calls, seconds]
+		self.actor_stats = {}  # Actor-type-name: [calls, seconds]
+		self.message_counts = {}  # (actor-type-name, message-name): amount of messages sent
+
+	def set_enabled(self, enabled):
+		"""
+		Turns the profiler on or off. The numbers measured so far are kept.
+		:param enabled: True to turn it on, False to turn it off
+		:return: None
+		"""
+		self.enabled = enabled
+
+	def reset(self):
+		"""
+		Forgets everything measured so far.
+		"""
+		self.component_stats = {}
+		self.actor_stats = {}
+		self.message_counts = {}
+
+	def add_component_time(self, component_name, seconds):
+		stats = self.component_stats.setdefault(component_name, [0, 0.])
+		stats[0] += 1
+		stats[1] += seconds
+
+	def add_actor_time(self, actor_name, seconds):
+		stats = self.actor_stats.setdefault(actor_name, [0, 0.])
+		stats[0] += 1
+		stats[1] += seconds
+
+	def count_message(self, actor_name, message_name):
+		key = (actor_name, message_name)
+		self.message_counts[key] = self.message_counts.get(key, 0) + 1
+
+	def get_report(self):
+		"""
+		Returns everything measured so far as readable text, the most expensive first.
+		"""
+		lines = ["%-50s %10s %12s %12s" % ("component / actor-type", "calls", "total ms", "ms per call")]
+		for title, stats in (("Components:", self.component_stats), ("Actor-types:", self.actor_stats)):
+			lines.append(title)
+			for name, (calls, seconds) in sorted(stats.items(), key=lambda item: -item[1][1]):
+				lines.append("  %-48s %10i %12.2f %12.4f" % (name, calls, 1000. * seconds, 1000. * seconds / calls))
+		lines.append("Messages:")
+		for (actor_name, message_name), amount in sorted(self.message_counts.items(), key=lambda item: -item[1]):
+			lines.append("  %-48s %10i" % ("%s: %s" % (actor_name, message_name), amount))
+		return "\n".join(lines)
@@ -0,0 +1,204 @@
+import logging
+import queue
+import threading
+from array import array
+
+from globals import pygame
+
+
+class ChunkStreamer(object):
+	"""
+	Keeps only the chunks of the layers around the camera in memory, for levels too big to be held completely
+	(see LevelCache.ChunkedLayers and World.set_streamed_layers()):
+	-Chunks within self.load_margin chunks of the screen are loaded by a thread in the background
+	-Chunks farther than self.keep_margin chunks from the screen are thrown away, unless a tile of them was changed
+	-Chunks that are needed before they're loaded (e.g. by a collision check far away) are loaded right away
+
+	The chunks of all layers at the same position are loaded and thrown away together.
+	"""
+
+	def __init__(self, chunked_layers, tile_size, load_margin=1, keep_margin=2, log_level=logging.ERROR):
+		"""
+		:param chunked_layers: The LevelCache.ChunkedLayers of the level
+		:param tile_size: Size of the tiles in pixels
+		:param load_margin: Chunks this many chunks around the screen are loaded in the background
+		:param keep_margin: Chunks farther away than this are thrown away, must be at least load_margin
+		:param log_level: The level of the logger
+		"""
+		assert load_margin <= keep_margin, "Chunks would be thrown away right after they were loaded."
+		self.chunked_layers = chunked_layers
+		self.chunk_size = chunked_layers.chunk_size
+		self.chunk_grid_size = chunked_layers.chunk_grid_size
+		self.chunk_pixel_size = (self.chunk_size[0]*tile_size[0], self.chunk_size[1]*tile_size[1])
+		self.load_margin = load_margin
+		self.keep_margin = keep_margin
+		# The chunks in memory: position (in chunks): list of arrays, one per layer
+		self.chunks = {}
+		# Chunks with changed tiles, they can't be thrown away:
+		self.changed_chunks = set()
+
+		# The loader-thread, started when the first chunk is requested:
+		self._lock = threading.Lock()  # Guards self.chunks and self._requested_chunks
+		self._requests = queue.Queue()
+		self._requested_chunks = set()  # Chunks in the queue of the loader-thread
+		self._loader_thread = None
+
+		# Create logger
+		self.logger = logging.getLogger("Chunk Streamer")
+		self.logger.setLevel(log_level)
+
+	def _read_chunk(self, chunk):
+		"""
+		Reads a chunk of every layer.
+		"""
+		return [self.chunked_layers.read_chunk(layer, chunk) for layer in range(self.chunked_layers.layer_amount)]
+
+	def load_chunk(self, chunk):
+		"""
+		Returns the arrays of a chunk, loading it right away if it's not in memory.
+		:param chunk: The position of the chunk (in chunks)
+		:return: List of arrays, one per layer
+		"""
+		chunk_layers = self.chunks.get(chunk)
+		if chunk_layers is None:
+			chunk_layers = self._read_chunk(chunk)
+			with self._lock:
+				# The loader-thread might have been faster:
+				chunk_layers = self.chunks.setdefault(chunk, chunk_layers)
+			self.logger.debug("Loaded chunk %s while it was needed." % (chunk, ))
+		return chunk_layers
+
+	def _load_requested_chunks(self):
+		"""
+		The loader-thread: Loads the requested chunks until None is requested.
+		"""
+		while True:
+			chunk = self._requests.get()
+			if chunk is None:
+				return
+			try:
+				chunk_layers = self._read_chunk(chunk)
+			except Exception as error:
+				# E.g. the file was closed - the chunk is loaded right away when it's needed:
+				self.logger.warning("Couldn't load chunk %s: %s" % (chunk, error))
+				chunk_layers = None
+			with self._lock:
+				if chunk_layers is not None:
+					self.chunks.setdefault(chunk, chunk_layers)
+				self._requested_chunks.discard(chunk)
+
+	def _get_chunks_around(self, viewport, margin):
+		"""
+		Returns the positions of the chunks within margin chunks of the viewport, that exist in the level.
+		"""
+		first_chunk = (max(viewport.left // self.chunk_pixel_size[0] - margin, 0),
+					   max(viewport.top // self.chunk_pixel_size[1] - margin, 0))
+		last_chunk = (min((viewport.right-1) // self.chunk_pixel_size[0] + margin, self.chunk_grid_size[0]-1),
+					  min((viewport.bottom-1) // self.chunk_pixel_size[1] + margin, self.chunk_grid_size[1]-1))
+		return [(x, y) for y in range(first_chunk[1], last_chunk[1]+1) for x in range(first_chunk[0], last_chunk[0]+1)]
+
+	def update(self, viewport):
+		"""
+		Requests the chunks around the viewport from the loader-thread and throws away the ones far away.
+		Called once per frame.
+		:param viewport: The visible part of the world, in pixels
+		:return: None
+		"""
+		# Request the chunks that will be needed soon:
+		with self._lock:
+			missing_chunks = [chunk for chunk in self._get_chunks_around(viewport, self.load_margin)
+							  if chunk not in self.chunks and chunk not in self._requested_chunks]
+			self._requested_chunks.update(missing_chunks)
+		if missing_chunks and self._loader_thread is None:
+			self._loader_thread = threading.Thread(target=self._load_requested_chunks, name="Chunk loader")
+			self._loader_thread.daemon = True
+			self._loader_thread.start()
+		for chunk in missing_chunks:
+			self._requests.put(chunk)
+
+		# Throw away the chunks far away:
+		keep_rect = viewport.inflate(2*self.keep_margin*self.chunk_pixel_size[0], 2*self.keep_margin*self.chunk_pixel_size[1])
+		with self._lock:
+			for chunk in list(self.chunks):
+				chunk_rect = pygame.Rect((chunk[0]*self.chunk_pixel_size[0], chunk[1]*self.chunk_pixel_size[1]),
+										 self.chunk_pixel_size)
+				if not keep_rect.colliderect(chunk_rect) and chunk not in self.changed_chunks:
+					del self.chunks[chunk]
+
+	def close(self):
+		"""
+		Stops the loader-thread and closes the file. Chunks that aren't in memory can't be loaded afterwards.
+		"""
+		if self._loader_thread is not None:
+			self._requests.put(None)
+			self._loader_thread.join()
+			self._loader_thread = None
+		self.chunked_layers.close()
+
+
+class StreamedLayer(object):
+	"""
+	A layer of a streamed world, used by World like the arrays of the other layers (see World.tile_grid_layers):
+	Indexed by cell-id, it returns the tile-type of the cell, wherever its chunk is (see ChunkStreamer).
+	Slices (without step) return an array, copied from the chunks in one piece per chunk and row.
+	"""
+
+	def __init__(self, streamer, layer, grid_size):
+		"""
+		:param streamer: The ChunkStreamer of the world
+		:param layer: The index of the layer
+		:param grid_size: Size of the grid in tiles
+		"""
+		self.streamer = streamer
+		self.layer = layer
+		self.grid_width = grid_size[0]
+		self._length = grid_size[0]*grid_size[1]
+		self.chunk_width, self.chunk_height = streamer.chunk_size
+
+	def _locate(self, cell):
+		"""
+		Returns the position of the chunk of a cell and the index of the cell in the chunk.
+		"""
+		if cell < 0:
+			cell += self._length
+		if not 0 <= cell < self._length:
+			raise IndexError("Cell %i isn't in the layer." % cell)
+		x, y = cell % self.grid_width, cell // self.grid_width
+		return (x // self.chunk_width, y // self.chunk_height), (y % self.chunk_height)*self.chunk_width + x % self.chunk_width
+
+	def __len__(self):
+		return self._length
+
+	def __getitem__(self, cell):
+		if type(cell) is slice:
+			return self._get_slice(cell)
+		chunk, index = self._locate(cell)
+		chunk_layers = self.streamer.chunks.get(chunk)
+		if chunk_layers is None:
+			chunk_layers = self.streamer.load_chunk(chunk)
+		return chunk_layers[self.layer][index]
+
+	def __setitem__(self, cell, tile_type):
+		chunk, index = self._locate(cell)
+		self.streamer.load_chunk(chunk)[self.layer][index] = tile_type
+		# The change would be lost if the chunk was thrown away:
+		self.streamer.changed_chunks.add(chunk)
+
+	def _get_slice(self, cells):
+		"""
+		Returns the tile-types of a slice of cells as array("I").
+		"""
+		start, stop, step = cells.indices(self._length)
+		assert step == 1, "Slices of streamed layers can't have a step."
+		tile_types = array("I")
+		while start < stop:
+			# Copy everything up to the end of the row in the chunk:
+			x = start % self.grid_width
+			end = min(stop, start - x + min((x // self.chunk_width + 1)*self.chunk_width, self.grid_width))
+			chunk, index = self._locate(start)
+			chunk_layers = self.streamer.chunks.get(chunk)
+			if chunk_layers is None:
+				chunk_layers = self.streamer.load_chunk(chunk)
+			tile_types.extend(chunk_layers[self.layer][index:index + end - start])
+			start = end
+		return tile_types
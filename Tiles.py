@@ -1,5 +1,6 @@
 from GameActor import *
 from Animation import *
+from Materials import *
 
 
 class BaseTile(GameActor):
@@ -26,6 +27,9 @@ class BaseTile(GameActor):
 	-platform_fallthrough: A platform through which can be jumped if coming from the bottom up
 		Is also pervious in certain states of Wario, like the zombie-wario.
 
+	Every material group also has a bit in an integer mask (see Materials), which the world sets using
+	set_material_mask(). Use the mask for collision-checks, it's much faster than comparing strings.
+
 	Note: The transparency color is always (225, 0, 255), also called "magic-pink"
 	"""
 
@@ -33,8 +37,10 @@ class BaseTile(GameActor):
 		super(BaseTile, self).__init__(position, engine)
 		# Set material_group (only for physics, see class description)
 		self.material_group = material_group
+		# The bit of the material_group, set by the world:
+		self.material_mask = 0
 		# Create the animation-instance containing all surfaces
-		self.animation = Animation(tiles_list, 10)
+		self.animation = Animation(tiles_list, 10, engine.assets)
 		self.animation.update()
 		# Create owm rect
 		self.rect = pygame.Rect((0, 0), tiles_list[0].get_size())
@@ -43,14 +49,58 @@ class BaseTile(GameActor):
 		if property_name == "material_group":
 			self.material_group = property_value
 		elif property_name == "alpha":
-			for sprite in self.animation.sprites:
+			# The sprites are shared with other worlds (see AssetCache), so only copies of them are changed:
+			sprites = [sprite.copy() for sprite in self.animation.sprites]
+			for sprite in sprites:
 				sprite.set_alpha(0)
+			self.set_animation(sprites, self.animation.sprite_order)
 
 	def get_material_group(self):
 		return self.material_group
 
+	def set_material_mask(self, material_mask):
+		self.material_mask = material_mask
+
+	def get_material_mask(self):
+		return self.material_mask
+
+	def set_animation(self, sprites, sprite_order):
+		"""
+		Replaces the animation of the tile. See Animation for the arguments.
+		"""
+		self.animation = Animation(sprites, sprite_order, self.engine.assets)
+		self.animation.update()
+
+	def update_animation(self, frame):
+		"""
+		Shows the sprite of a frame of the animation clock of the world (see World.update()). Called by the world,
+		not by update(), because all tiles of a type share one animation.
+		:param frame: The frame of the animation clock
+		"""
+		self.animation.seek(frame)
+
+	def is_static(self):
+		"""
+		Returns True if the tile always looks the same, meaning it can be baked (see World.bake_layers()).
+		"""
+		return len(self.animation.sprite_order) == 1
+
+	def get_frame(self):
+		"""
+		Returns the current frame of the animation as (page, area) of the atlas, used by the world to draw all tiles
+		of this type.
+		"""
+		return self.animation.get_frame()
+
+	def get_surface(self):
+		"""
+		Returns the current surface of the animation.
+		"""
+		return self.animation.get_surface()
+
 	def _update(self):
-		self.engine.graphics.blit(self.animation.get_surface(), self.rect)
+		page, area = self.animation.get_frame()
+		self.engine.graphics.blit(page, self.rect, area)
 
 
 class EmptyTile(BaseTile):
@@ -64,5 +114,14 @@ class EmptyTile(BaseTile):
 	def update(self):
 		pass
 
+	def is_static(self):
+		return True
+
 	def get_material_group(self):
 		return "empty"
+
+	def set_material_mask(self, material_mask):
+		pass
+
+	def get_material_mask(self):
+		return Materials.EMPTY
@@ -1,13 +1,23 @@
 import xml.etree.ElementTree as ET
 from globals import pygame
 from pygame.locals import *
+import base64
 import copy
+import gzip
+import sys
+import zlib
+from array import array
 from EngineController import *
 import utilities
 from Tiles import *
+from Materials import *
+from Streaming import *
 
 
 class World(EngineController):
+	# The lower 29 bits of a tile in a tmx-file are its type, the highest three are flip-flags:
+	gid_mask = 0x1FFFFFFF
+
 	def __init__(self, engine):
 		"""
 		Stores and manages all world-related data, most important of all, the tiles.
@@ -15,37 +25,169 @@ class World(EngineController):
 		super(World, self).__init__(engine)
 		self.grid_size = (1, 1)  # Size of grid in amount of tiles
 		self.tile_size = (1, 1)  # Size of indiv. tiles
-		self.tile_grid_layers = {}  # All tiles of all layers are stored in this list, see self.load_tmx()
+		self.tile_grid_layers = {}  # Arrays with the type of every tile of every layer, see self.create_tile()
 		self.tmx_root = None  # Root used by ET to parse, see self.load_tmx()
 		self.layer_names = ["background_color", "background", "sticky_background", "main"]
-		self.tile_images = utilities.split_tiled_image(pygame.image.load("tileset_n1.png").convert(), (16, 16),
-													   (225, 0, 225))
+		# The clips of the animations of the level, set by the engine, see Engine._build_world():
+		self.clip_cache = None
+		# The images of the tiles are shared with every other world, see AssetCache:
+		self.tile_images = engine.assets.get_frames("tileset_n1.png", (16, 16), colorkey=(225, 0, 225), alpha=False)
 		# Create the tiles:
 		self.tiles = {i: BaseTile((0, 0), engine, "deco", [img]) for img, i in zip(self.tile_images, range(len(self.tile_images)))}
 		# Add an empty tile:
 		self.tiles[-1] = EmptyTile()
-		self.tile_by_types = {tile.get_material_group(): [] for tile in self.tiles.values()}
+		# Tile types with an animation, advanced once per frame by the animation clock, see self._advance_animations()
+		self.animated_tile_types = []
+		self.animated_tile_type_indexes = set()  # Their indexes in self.tile_types, which the layers store
+		self.animation_frame = 0  # Frames counted by the animation clock
+		# Registry which maps the material groups to bits:
+		self.materials = MaterialRegistry()
+		# Give every tile the mask of its material group:
+		for tile in self.tiles.values():
+			tile.set_material_mask(self.materials.get_mask(tile.get_material_group()))
+		# The tile-type table: The layers only store the index of a tile in this list, and everything else (material,
+		# animation, surface) is stored once per type. Index 0 is the empty tile, index i+1 the tile with the id i.
+		self.tile_types = [self.tiles[-1]] + [self.tiles[i] for i in range(len(self.tile_images))]
+		# The material mask of every tile type, used as grid-cell index together with the layers:
+		self.tile_type_masks = array("I", [tile.get_material_mask() for tile in self.tile_types])
+
+		# Layer-baking: The static tiles of these layers are drawn onto big chunk-surfaces, see self.bake_layers()
+		self.layer_baking = True
+		self.baked_layer_names = ["background", "sticky_background", "main"]
+		self.chunk_size = (256, 256)  # Size of the chunk-surfaces in pixels
+		self.chunk_colorkey = (255, 0, 255)  # Same colorkey as the surfaces of the animations
+		self.layer_chunks = {}  # Chunk-surfaces of every baked layer, by position of the chunk (in chunks)
+		# Positions of the chunks that are baked and up to date (with or without surface), by layer. All others have to
+		# be baked before they're drawn:
+		self.baked_chunks = {}
+		# Chunks are only baked once they're visible. If a layer has more baked chunks than this, the ones farthest
+		# away from the screen are thrown away (and baked again if they're visible again), so big levels don't need
+		# a surface for every chunk. The visible chunks are always kept, and twice as many chunks if the screen is huge:
+		self.max_chunks_per_layer = 48
+
+		# Streaming: For levels too big to be held in memory, the layers are StreamedLayers, see set_streamed_layers()
+		self.streamer = None
+
+	@staticmethod
+	def decode_tmx_layer(data_element, grid_size):
+		"""
+		Decodes the data of a layer of a tmx-file in one go, without looping over the tiles in python.
+		All encodings of the Tiled-editor are supported: csv, base64 (uncompressed, zlib or gzip) and plain xml.
+		Flip-flags are removed, flipped tiles are drawn unflipped.
+		It's static, so levels can be parsed without a world, e.g. in another thread.
+		:param data_element: The <data>-element of the layer
+		:param grid_size: Size of grid in tiles
+		:return: array("I") with the type of every tile (tile-id + 1, 0 for empty tiles), row by row
+		"""
+		encoding = data_element.attrib.get("encoding")
+		compression = data_element.attrib.get("compression")
+
+		if encoding == "csv":
+			# int() ignores the line-breaks, so the whole layer can be converted at once:
+			layer_types = array("I", map(int, data_element.text.split(",")))
+		elif encoding == "base64":
+			raw_data = base64.b64decode(data_element.text.strip())
+			if compression == "zlib":
+				raw_data = zlib.decompress(raw_data)
+			elif compression == "gzip":
+				raw_data = gzip.decompress(raw_data)
+			else:
+				assert compression is None, "Unsupported compression \"%s\"." % compression
+			# The data consists of little-endian unsigned 32-bit integers, so it can be copied directly:
+			layer_types = array("I")
+			layer_types.frombytes(raw_data)
+			if sys.byteorder == "big":
+				layer_types.byteswap()
+		else:
+			assert encoding is None, "Unsupported encoding \"%s\"." % encoding
+			# Plain xml: One <tile>-element per tile:
+			layer_types = array("I", [int(tile.attrib.get("gid", 0)) for tile in data_element.findall("tile")])
+
+		assert len(layer_types) == grid_size[0]*grid_size[1], "Layer doesn't fit the grid."
+		# Remove the flip-flags, if there are any:
+		if layer_types and max(layer_types) > World.gid_mask:
+			layer_types = array("I", [tile_type & World.gid_mask for tile_type in layer_types])
+		return layer_types
+
+	@staticmethod
+	def parse_tmx_layers(tmx_root, grid_size):
+		"""
+		Decodes every tile-layer of a parsed tmx-file, see decode_tmx_layer().
+		:param tmx_root: The root-element of the tmx-file
+		:param grid_size: Size of grid in tiles
+		:return: List of arrays, one per layer
+		"""
+		return [World.decode_tmx_layer(layer.find("data"), grid_size) for layer in tmx_root.findall("layer")]
+
+	def _get_cells_in_rect(self, rect):
+		"""
+		Returns the ids of all grid-cells a rect overlaps, row by row. Cells outside of the grid are left out.
+		Only touching a cell with an edge doesn't count as overlapping, the same way pygame.Rect.colliderect does it.
+		:param rect: The rect in pixels
+		:return: List of cell-ids, which are the same as the tile-ids of the layers
+		"""
+		# Rects without an area don't collide with anything:
+		if rect.width <= 0 or rect.height <= 0:
+			return []
+
+		first_column, last_column, first_row, last_row = self._get_cell_bounds(rect)
+		return [row*self.grid_size[0] + column
+				for row in range(first_row, last_row+1)
+				for column in range(first_column, last_column+1)]
 
-	def _get_rects_with_material_group(self, layer, material_group):
+	def _get_cell_bounds(self, rect):
 		"""
-		Returns all tiles of a layer that have a certain material group or multiple material group
-		:param layer: The layer on which the rects should be
-		:param material_group: material group or list of material-groups
-		:return: List of tiles with that/these material-group/s
+		Returns the first and last column and row a rect overlaps, clamped to the grid.
+		"""
+		return (max(rect.left // self.tile_size[0], 0), min((rect.right-1) // self.tile_size[0], self.grid_size[0]-1),
+				max(rect.top // self.tile_size[1], 0), min((rect.bottom-1) // self.tile_size[1], self.grid_size[1]-1))
+
+	def _get_types_in_rect(self, layer_types, rect):
+		"""
+		Returns the tile-types of the cells self._get_cells_in_rect() returns, in the same order. Every row is copied
+		at once, which is much faster than looking up every cell, especially for streamed layers.
+		:param layer_types: The array (or StreamedLayer) of the layer
+		:param rect: The rect in pixels
+		:return: array("I") of tile-types
+		"""
+		tile_types = array("I")
+		if rect.width <= 0 or rect.height <= 0:
+			return tile_types
+
+		first_column, last_column, first_row, last_row = self._get_cell_bounds(rect)
+		if first_column > last_column:
+			return tile_types
+		for row in range(first_row, last_row+1):
+			tile_types.extend(layer_types[row*self.grid_size[0]+first_column:row*self.grid_size[0]+last_column+1])
+		return tile_types
+
+	def _get_colliding_cells(self, layer, material_group, rect):
 		"""
-		# Make list out of material_group
-		material_groups = [material_group] if type(material_group) is not list else material_group
+		Returns the ids of all cells of a layer that overlap with a rect and contain a tile with a certain
+		material group or one of multiple material groups.
+		Only the cells covered by the rect are looked at, so the cost doesn't depend on the size of the level.
+		:param layer: The layer on which the cells should be
+		:param material_group: material mask, material group or list of material-groups
+		:param rect: The rect in pixels
+		:return: List of cell-ids
+		"""
+		# Make a mask out of material_group
+		mask = self.materials.get_mask(material_group)
 		# Catch possible errors:
 		assert layer in self.tile_grid_layers, "Layer %i doesn't exist." % layer
 
-		# Create return-list
-		return_list = []
-		for material_group in material_groups:
-			if material_group in self.tile_by_types[layer]:
-				return_list.extend([self.tile_grid_layers[layer][i].rect
-									for i in self.tile_by_types[layer][material_group]])
+		# Look up the material mask of the tile type in every covered cell:
+		layer_types = self.tile_grid_layers[layer]
+		type_masks = self.tile_type_masks
+		return [cell for cell in self._get_cells_in_rect(rect) if type_masks[layer_types[cell]] & mask]
 
-		return return_list
+	def _get_cell_rect(self, cell):
+		"""
+		Returns the rect of a cell. Tiles don't store their rects, so they're created when needed.
+		:param cell: The id of the cell
+		:return: pygame.Rect of the cell in pixels
+		"""
+		return pygame.Rect(self._get_tile_pos_by_id(cell), self.tile_size)
 
 	def _get_tile_id_by_pos(self, pos):
 		"""
@@ -62,7 +204,7 @@ class World(EngineController):
 		:return: The position of the tile
 		"""
 		x = (tile_id % self.grid_size[0])*self.tile_size[0]
-		y = (tile_id-(tile_id%self.grid_size[0]))/self.grid_size[0]*self.tile_size[1]
+		y = (tile_id-(tile_id%self.grid_size[0]))//self.grid_size[0]*self.tile_size[1]
 
 		return x, y
 
@@ -73,10 +215,185 @@ class World(EngineController):
 		else:
 			return self.layer_names.index(name)
 
-	def update(self):
+	def _get_chunk_of_cell(self, cell):
+		"""
+		Returns the position of the chunk a cell lies in.
+		:param cell: The id of the cell
+		:return: Position of the chunk (in chunks)
+		"""
+		x, y = self._get_tile_pos_by_id(cell)
+		return x // self.chunk_size[0], y // self.chunk_size[1]
+
+	def _bake_dirty_chunks(self, layer, visible_chunks):
+		"""
+		Draws the static tiles of every visible chunk of a layer that isn't baked (or not up to date) onto the surface
+		of the chunk. Chunks that don't contain any static tile don't get a surface.
+		:param layer: The baked layer
+		:param visible_chunks: The positions of the visible chunks, see self._get_chunks_in_rect()
+		:return: True if a chunk was baked
+		"""
+		layer_types = self.tile_grid_layers[layer]
+		animated_types = self.animated_tile_type_indexes
+		baked_chunks = [chunk for chunk in visible_chunks if chunk not in self.baked_chunks[layer]]
+		for chunk in baked_chunks:
+			# Get the surface of the chunk or create it, if it doesn't exist already:
+			if chunk in self.layer_chunks[layer]:
+				chunk_surface = self.layer_chunks[layer][chunk]
+			else:
+				chunk_surface = pygame.Surface(self.chunk_size)
+				chunk_surface.set_colorkey(self.chunk_colorkey)
+			# Clear the surface:
+			chunk_surface.fill(self.chunk_colorkey)
+
+			# Draw every static tile in the chunk, relative to the chunk:
+			chunk_rect = pygame.Rect((chunk[0]*self.chunk_size[0], chunk[1]*self.chunk_size[1]), self.chunk_size)
+			baked_tiles = 0
+			for cell, tile_type in zip(self._get_cells_in_rect(chunk_rect), self._get_types_in_rect(layer_types, chunk_rect)):
+				# Skip empty and animated tiles:
+				if tile_type and tile_type not in animated_types:
+					position = self._get_tile_pos_by_id(cell)
+					page, area = self.tile_types[tile_type].get_frame()
+					chunk_surface.blit(page, (position[0]-chunk_rect.x, position[1]-chunk_rect.y), area)
+					baked_tiles += 1
+
+			# Only keep chunks that contain something:
+			if baked_tiles:
+				self.layer_chunks[layer][chunk] = chunk_surface
+			elif chunk in self.layer_chunks[layer]:
+				del self.layer_chunks[layer][chunk]
+			self.baked_chunks[layer].add(chunk)
+
+		# Throw away the chunks farthest away from the visible ones, if there are too many. Visible chunks are never
+		# thrown away, they'd have to be baked again every frame if the screen shows more than the limit:
+		max_chunks = max(self.max_chunks_per_layer, 2*len(visible_chunks))
+		if len(self.baked_chunks[layer]) > max_chunks:
+			center = visible_chunks[len(visible_chunks)//2]
+			visible = set(visible_chunks)
+			chunks = sorted((chunk for chunk in self.baked_chunks[layer] if chunk not in visible),
+							key=lambda chunk: abs(chunk[0]-center[0]) + abs(chunk[1]-center[1]))
+			for chunk in chunks[max_chunks - len(visible):]:
+				self.layer_chunks[layer].pop(chunk, None)
+				self.baked_chunks[layer].discard(chunk)
+		return len(baked_chunks) > 0
+
+	def bake_layers(self):
+		"""
+		Prepares drawing the static tiles of the layers in self.baked_layer_names onto chunk-surfaces, so drawing one of
+		those layers only takes one blit per chunk. Animated tiles are still updated and drawn individually.
+		The chunks are baked when they're visible for the first time, see self.draw().
+		Should be called once all tiles are created. Does nothing if self.layer_baking is False.
+		:return: None
+		"""
+		self.layer_chunks = {}
+		self.baked_chunks = {}
+		if not self.layer_baking:
+			return
+
+		for layer_name in self.baked_layer_names:
+			layer = self._get_layer_id(layer_name)
+			# Skip layers that don't exist in this level:
+			if layer not in self.tile_grid_layers:
+				continue
+			self.layer_chunks[layer] = {}
+			# Every chunk has to be baked:
+			self.baked_chunks[layer] = set()
+
+	def _get_chunks_in_rect(self, rect):
+		"""
+		Returns the positions of all chunks a rect overlaps, whether they have a surface or not.
+		:param rect: The rect in pixels
+		:return: List of chunk-positions (in chunks)
+		"""
+		first_chunk = (max(rect.left // self.chunk_size[0], 0), max(rect.top // self.chunk_size[1], 0))
+		last_chunk = ((rect.right-1) // self.chunk_size[0], (rect.bottom-1) // self.chunk_size[1])
+		return [(x, y) for y in range(first_chunk[1], last_chunk[1]+1) for x in range(first_chunk[0], last_chunk[0]+1)]
+
+	def _draw_layers(self, viewport, draw_static, draw_animated):
+		"""
+		Draws the visible tiles of every layer.
+		:param viewport: The visible part of the world
+		:param draw_static: True if static tiles (including the chunks of baked layers) should be drawn
+		:param draw_animated: True if animated tiles should be updated and drawn
+		:return: None
+		"""
+		visible_cells = self._get_cells_in_rect(viewport)
+		graphics = self.engine.graphics
+		animated_types = self.animated_tile_type_indexes
+
 		for layer_index in range(len(self.tile_grid_layers)):
-			for tile in self.tile_grid_layers[layer_index]:
-				tile.update()
+			layer_types = self.tile_grid_layers[layer_index]
+			# If layer is baked, draw its chunks and only draw the animated tiles one by one:
+			if layer_index in self.layer_chunks:
+				if draw_static:
+					for chunk in self._get_chunks_in_rect(viewport):
+						if chunk in self.layer_chunks[layer_index]:
+							graphics.blit(self.layer_chunks[layer_index][chunk],
+										  (chunk[0]*self.chunk_size[0], chunk[1]*self.chunk_size[1]))
+				if draw_animated:
+					for cell, tile_type in zip(visible_cells, self._get_types_in_rect(layer_types, viewport)):
+						if tile_type in animated_types:
+							page, area = self.tile_types[tile_type].get_frame()
+							graphics.blit(page, self._get_tile_pos_by_id(cell), area)
+			else:
+				for cell, tile_type in zip(visible_cells, self._get_types_in_rect(layer_types, viewport)):
+					# Skip empty tiles:
+					if tile_type:
+						tile = self.tile_types[tile_type]
+						if (draw_static and draw_animated) or tile.is_static() == draw_static:
+							page, area = tile.get_frame()
+							graphics.blit(page, self._get_tile_pos_by_id(cell), area)
+
+	def _advance_animations(self):
+		"""
+		The animation clock: Advances the animation of every animated tile type exactly once per frame.
+		All tiles of a type share the animation of the type (see self.create_tile()), so they're in sync,
+		and their speed doesn't depend on how many of them are placed or visible.
+		"""
+		self.animation_frame += 1
+		for tile in self.animated_tile_types:
+			tile.update_animation(self.animation_frame)
+
+	def update(self):
+		# Advance the animations:
+		self._advance_animations()
+		# Load the chunks around the camera, if the world is streamed:
+		if self.streamer is not None:
+			self.streamer.update(self.engine.graphics.get_viewport())
+
+	def close(self):
+		"""
+		Stops streaming, if the world is streamed. Called when another world replaces this one.
+		"""
+		if self.streamer is not None:
+			self.streamer.close()
+
+	def draw(self):
+		"""
+		Draws the visible part of the world, called once per rendered frame after update().
+		"""
+		graphics = self.engine.graphics
+		# Nothing to draw if rendering is turned off, see Graphics.set_rendering():
+		if not graphics.rendering:
+			return
+		# Only what's visible on the screen gets drawn:
+		viewport = graphics.get_viewport()
+
+		# Bake the visible chunks that weren't baked yet, or whose tiles changed:
+		visible_chunks = self._get_chunks_in_rect(viewport)
+		for layer_index in self.baked_chunks:
+			if self._bake_dirty_chunks(layer_index, visible_chunks):
+				graphics.invalidate_background()
+
+		if graphics.dirty_rect_mode:
+			# Static tiles are only drawn onto the background, and only if it has to be drawn again.
+			# Note that animated tiles are therefore always drawn on top of all static tiles.
+			if graphics.needs_background():
+				graphics.begin_background()
+				self._draw_layers(viewport, True, False)
+				graphics.commit_background()
+			self._draw_layers(viewport, False, True)
+		else:
+			self._draw_layers(viewport, True, True)
 
 	def get_tile_by_material_group(self, material_group):
 		"""
@@ -85,49 +402,44 @@ class World(EngineController):
 		:return: Tile-instance
 		"""
 
-		for tile in self.tiles:
-			if tile.material_group == type:
+		for tile in self.tiles.values():
+			if tile.get_material_group() == material_group:
 				return tile
-		else:
-			assert material_group in self.tiles, "Material-group unknown."
+		assert False, "Material-group \"%s\" unknown." % material_group
 
 	def get_colliding_rect(self, layer, material_group, rect):
 		"""
 		Returns a tile-instance that collides with a given rect and has a certain material_group.
 		Returns None if no collision happens.
 		:param layer: The layer on which the tiles should be checked.
-		:param material_group: The desired material_group.
+		:param material_group: The desired material mask (see Materials), material_group or list of material_groups.
 		:param rect: The colliding rect.
 		:return: A tile instance that collides with the given rect.
 		"""
 
 		# Catch possible errors:
-		assert layer in self.tile_by_types, "Layer does not exist."
+		assert layer in self.tile_grid_layers, "Layer does not exist."
 
-		# First, get a list of all rects that have the desired material-group:
-		rects_with_material_group = self._get_rects_with_material_group(layer, material_group)
-		# ...and let pygame do the work. Pygame is in C, so it's much faster than doing it in python...
-		colliding_index = rect.collidelist(rects_with_material_group)
+		# Only look at the cells the rect actually covers:
+		colliding_cells = self._get_colliding_cells(layer, material_group, rect)
 		# Return None if no collision happens, else the colliding rect:
-		return None if colliding_index == -1 else rects_with_material_group[colliding_index]
+		return None if not colliding_cells else self._get_cell_rect(colliding_cells[0])
 
 	def get_colliding_rects(self, layer, material_group, rect):
 		"""
 		Returns a list of tile-instances that collide with a given rect and have a certain material-group.
 		Returns an empty list if no collision happens.
 		:param layer: The layer on which the tiles should be checked.
-		:param material_group: The desired material_group.
+		:param material_group: The desired material mask (see Materials), material_group or list of material_groups.
 		:param rect: The colliding rect.
 		:return: List of tile-instances that collide with the given rect
 		"""
 		# Catch possible errors:
-		assert layer in self.tile_by_types, "Layer does not exist."
+		assert layer in self.tile_grid_layers, "Layer does not exist."
 
-		# First get the rects of the demanded material group
-		rects_with_material_group = self._get_rects_with_material_group(layer, material_group)
-		# ...and let python do the work. Python is in C, so it's much faster than doing it in python...
-		colliding_index = rect.collidelistall(rects_with_material_group)
-		return map(lambda index: rects_with_material_group[index], colliding_index)
+		# Only look at the cells the rect actually covers:
+		colliding_cells = self._get_colliding_cells(layer, material_group, rect)
+		return [self._get_cell_rect(cell) for cell in colliding_cells]
 
 	def get_tile_relative_to(self, layer, rect, offset):
 		"""
@@ -143,11 +455,11 @@ class World(EngineController):
 		# Calculate the maximum position a tile can have:
 		max_pos = list(map(lambda x, y: x*y, self.tile_size, self.grid_size))
 		# If wanted tile is outside the map (=doesn't exist), return a deco-tile:
-		if pos_of_wanted_rect[0] > max_pos[0] or pos_of_wanted_rect[0] < 0 or \
-			pos_of_wanted_rect[1] > max_pos[1] or pos_of_wanted_rect[1] < 0:
+		if pos_of_wanted_rect[0] >= max_pos[0] or pos_of_wanted_rect[0] < 0 or \
+			pos_of_wanted_rect[1] >= max_pos[1] or pos_of_wanted_rect[1] < 0:
 			return self.get_tile_by_material_group("deco")
 		else:
-			return self.tile_grid_layers[layer][self._get_tile_id_by_pos(pos_of_wanted_rect)]
+			return self.get_tile(layer, self._get_tile_id_by_pos(pos_of_wanted_rect))
 
 	def get_tile_size(self):
 		"""Returns size of tiles in pixels"""
@@ -157,9 +469,15 @@ class World(EngineController):
 		"""Returns gridsize in number of tiles"""
 		return self.grid_size
 
+	def get_level_size(self):
+		"""Returns the size of the level in pixels"""
+		return self.grid_size[0]*self.tile_size[0], self.grid_size[1]*self.tile_size[1]
+
 	def get_tile(self, layer, pos_or_id):
 		"""
 		Returns the tile with either position or id "pos_or_id", depending on the type of pos_or_id.
+		The layers only store the types of the tiles, so the tile-instance is created on demand: It's a shallow copy
+		of the tile type with the right rect. Changing it doesn't change the world, use set_tile() for that.
 		:param layer: The layer on which the tile is located
 		:param pos_or_id: Either the position (tuple) or id (int) of the wanted tile-instance
 		:return: Wanted tile-instance
@@ -173,8 +491,10 @@ class World(EngineController):
 		else:
 			# Else just take pos_or_id
 			tile_id = pos_or_id
-		# Return the wanted tile
-		return self.tile_grid_layers[layer][tile_id]
+		# Create the wanted tile - copy.copy only makes a shallow copy, so animation-instance is the same as original
+		tile = copy.copy(self.tile_types[self.tile_grid_layers[layer][tile_id]])
+		tile.rect = self._get_cell_rect(tile_id)
+		return tile
 
 	def get_layer_amount(self):
 		"""
@@ -182,34 +502,89 @@ class World(EngineController):
 		"""
 		return len(self.tile_grid_layers)
 
+	def set_tile_animation(self, tile_id, frames):
+		"""
+		Gives a tile type an animation. Must be called before tiles of this type are created.
+		:param tile_id: The id of the tile in the tileset
+		:param frames: List of (tile_id, duration in frames) - the tiles the animation consists of
+		:return: None
+		"""
+		sprites = [self.tile_images[frame[0]] for frame in frames]
+		sprite_order = [(sprite, frame[1]) for sprite, frame in zip(range(len(frames)), frames)]
+		self.tiles[tile_id].set_animation(sprites, sprite_order)
+		# Update the list of the animation clock:
+		self.animated_tile_types = [tile for tile in self.tile_types if not tile.is_static()]
+		self.animated_tile_type_indexes = set(self.tile_types.index(tile) for tile in self.animated_tile_types)
+
 	def set_tile_property(self, tile_id, property_name, property_value):
 		self.tiles[tile_id].set_property(property_name, property_value)
+		# Keep the mask of the tile up to date:
+		if property_name == "material_group":
+			self.tiles[tile_id].set_material_mask(self.materials.get_mask(property_value))
+			self.tile_type_masks[tile_id+1] = self.tiles[tile_id].get_material_mask()
 
 	def get_full_grid(self):
-		return self.tile_grid_layers
+		"""
+		Returns every layer as a list-like TileLayerView, which creates the tile-instances only when accessed.
+		"""
+		return {layer: TileLayerView(self, layer) for layer in self.tile_grid_layers}
 
 	def create_tile(self, layer, position, size, tile_id):
-		# Create new tile - copy.copy only makes a shallow copy, so animation-instance is the same as original
-		new_tile = copy.copy(self.tiles[tile_id])
-		# Update the rect of the new tile:
-		new_tile.rect = pygame.Rect(position, size)
-		# Create the layer if he doesn't already exist:
+		"""
+		Places a tile in the grid. The tile isn't an instance, only its type is stored in the array of the layer.
+		:param layer: The layer on which the tile should be placed
+		:param position: The position of the tile in pixels
+		:param size: The size of the tile - must be the tile-size of the world
+		:param tile_id: The id of the tile in the tileset, -1 for an empty tile
+		:return: None
+		"""
+		# Create the layer if he doesn't already exist, filled with empty tiles:
 		if layer not in self.tile_grid_layers:
-			self.tile_grid_layers[layer] = []
-		# Append the new tile to this layer
-		self.tile_grid_layers[layer].append(new_tile)
-
-		# Update self.tile_by_types:
-		# Get the id of the current tile (with which the tile can be accessed in self.tile_grid_layers:
-		tile_id = len(self.tile_grid_layers[layer])-1
-		# If layer doesn't exist, create it:
-		if layer not in self.tile_by_types:
-			self.tile_by_types[layer] = {}
-		# If material_group doesn't exist, create it:
-		if new_tile.get_material_group() not in self.tile_by_types[layer]:
-			self.tile_by_types[layer][new_tile.get_material_group()] = []
-		# Append tile:
-		self.tile_by_types[layer][new_tile.get_material_group()].append(tile_id)
+			self.tile_grid_layers[layer] = array("I", [0])*(self.grid_size[0]*self.grid_size[1])
+		# Save the type of the tile in its cell:
+		self.tile_grid_layers[layer][self._get_tile_id_by_pos(position)] = tile_id+1
+
+	def set_layer(self, layer, tile_types):
+		"""
+		Sets all tiles of a layer at once.
+		:param layer: The layer
+		:param tile_types: array("I") with the type of every tile (tile-id + 1, 0 for empty tiles), row by row
+		:return: None
+		"""
+		assert len(tile_types) == self.grid_size[0]*self.grid_size[1], "Layer %i doesn't fit the grid." % layer
+		self.tile_grid_layers[layer] = array("I", tile_types)
+
+	def set_streamed_layers(self, chunked_layers):
+		"""
+		Streams all layers from a file instead of holding them in memory: Only the chunks around the camera are loaded
+		(see Streaming.ChunkStreamer). Every method of the world works the same, wherever the tiles are.
+		:param chunked_layers: The LevelCache.ChunkedLayers of the level, closed by self.close()
+		:return: None
+		"""
+		assert chunked_layers.grid_size == tuple(self.grid_size), "The layers don't fit the grid."
+		self.streamer = ChunkStreamer(chunked_layers, self.tile_size)
+		self.tile_grid_layers = {layer: StreamedLayer(self.streamer, layer, self.grid_size)
+								 for layer in range(chunked_layers.layer_amount)}
+
+	def set_tile(self, layer, pos_or_id, tile_id):
+		"""
+		Replaces an existing tile of the grid by a tile of another type, e.g. if a block gets destroyed.
+		If the layer is baked, the chunk of the tile gets baked again before it's drawn the next time.
+		:param layer: The layer on which the tile is located
+		:param pos_or_id: Either the position (tuple) or id (int) of the tile that should be replaced
+		:param tile_id: The id of the new tile in the tileset, -1 for an empty tile
+		:return: None
+		"""
+		# Get the cell of the tile:
+		cell = self._get_tile_id_by_pos(pos_or_id) if type(pos_or_id) is tuple else pos_or_id
+		# Replace the type of the old tile:
+		self.tile_grid_layers[layer][cell] = tile_id+1
+		# The background of the dirty-rect mode might show the old tile:
+		self.engine.graphics.invalidate_background()
+
+		# If the layer is baked, its chunk needs to be baked again:
+		if layer in self.baked_chunks:
+			self.baked_chunks[layer].discard(self._get_chunk_of_cell(cell))
 
 	def set_tile_size(self, tile_size):
 		"""
@@ -225,3 +600,24 @@ class World(EngineController):
 		:return: None
 		"""
 		self.grid_size = grid_size
+
+
+class TileLayerView(object):
+	"""
+	A read-only, list-like view of a layer of the world. The world only stores the types of the tiles,
+	so the tile-instances are created when they're accessed, see World.get_tile().
+	"""
+
+	def __init__(self, world, layer):
+		self.world = world
+		self.layer = layer
+
+	def __len__(self):
+		return len(self.world.tile_grid_layers[self.layer])
+
+	def __getitem__(self, tile_id):
+		return self.world.get_tile(self.layer, tile_id)
+
+	def __iter__(self):
+		for tile_id in range(len(self)):
+			yield self.world.get_tile(self.layer, tile_id)
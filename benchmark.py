@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+"""
+Stress-benchmark of the engine: Generates levels of increasing size with increasing amounts of spearheads,
+runs every combination headless for a fixed amount of frames and saves frames per second, percentiles of the
+frame-times and the peak memory as JSON, so the results can be compared over time.
+
+Every combination runs in its own process, so the memory of one doesn't show up in the next one.
+
+Example:
+	./benchmark.py --sizes 30x16,500x100,2000x500 --actors 0,100,1000 --frames 300 -o results.json
+
+With --replay, the first level is run with input recorded before (see main.py --record) instead, so the same run
+through it can be compared before and after a change.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+import zlib
+
+try:
+	import resource
+except ImportError:
+	# Not available on Windows, the peak-rss isn't measured there:
+	resource = None
+
+# The level every generated level is made of:
+SOURCE_LEVEL = "Forest_N1_1.tmx"
+
+
+def generate_level(path, grid_size, actor_amount, seed=0):
+	"""
+	Generates a level by repeating SOURCE_LEVEL until it has the wanted size, and saves it as tmx-file.
+	:param path: Path of the new tmx-file
+	:param grid_size: Size of the level in tiles
+	:param actor_amount: Amount of spearheads, spawned at random spawn-points of the repeated levels
+	:param seed: Seed of the random spawn-points
+	:return: None
+	"""
+	from World import World
+
+	source_root = ET.parse(SOURCE_LEVEL).getroot()
+	source_size = (int(source_root.attrib["width"]), int(source_root.attrib["height"]))
+	tile_size = (int(source_root.attrib["tilewidth"]), int(source_root.attrib["tileheight"]))
+	source_layers = World.parse_tmx_layers(source_root, source_size)
+
+	# Copy the map with its tilesets:
+	root = ET.Element("map", dict(source_root.attrib, width=str(grid_size[0]), height=str(grid_size[1])))
+	for tileset in source_root.findall("tileset"):
+		root.append(tileset)
+
+	# Repeat every layer, stored as zlib-compressed base64 like Tiled does:
+	for layer_element, source_layer in zip(source_root.findall("layer"), source_layers):
+		rows = []
+		for y in range(grid_size[1]):
+			source_row = source_layer[(y % source_size[1])*source_size[0]:(y % source_size[1]+1)*source_size[0]]
+			rows.append((source_row * (grid_size[0] // source_size[0] + 1))[:grid_size[0]])
+		layer = rows[0]
+		for row in rows[1:]:
+			layer.extend(row)
+		if sys.byteorder == "big":
+			layer.byteswap()
+		layer_element = ET.SubElement(root, "layer", {"name": layer_element.attrib["name"],
+													  "width": str(grid_size[0]), "height": str(grid_size[1])})
+		data = ET.SubElement(layer_element, "data", {"encoding": "base64", "compression": "zlib"})
+		data.text = base64.b64encode(zlib.compress(layer.tobytes())).decode("ascii")
+
+	# Wario stays where he is, the spearheads are spawned at the spawn-points of random copies of the level:
+	objects = ET.SubElement(root, "objectgroup", {"name": "game_actors"})
+	source_objects = source_root.find("objectgroup").findall("object")
+	spawn_points = [actor_object for actor_object in source_objects if actor_object.attrib["name"] == "Spearhead"]
+	for actor_object in source_objects:
+		if actor_object.attrib["name"] == "Wario":
+			objects.append(actor_object)
+	randomizer = random.Random(seed)
+	copies = (max(grid_size[0] // source_size[0], 1), max(grid_size[1] // source_size[1], 1))
+	for i in range(actor_amount):
+		spawn_point = randomizer.choice(spawn_points)
+		offset = (randomizer.randrange(copies[0])*source_size[0]*tile_size[0],
+				  randomizer.randrange(copies[1])*source_size[1]*tile_size[1])
+		ET.SubElement(objects, "object", dict(spawn_point.attrib,
+											  x=str(float(spawn_point.attrib["x"])+offset[0]),
+											  y=str(float(spawn_point.attrib["y"])+offset[1])))
+
+	ET.ElementTree(root).write(path, encoding="UTF-8", xml_declaration=True)
+
+
+def count_spearheads(level_path):
+	"""
+	Returns the amount of spearheads placed in a tmx-file, no matter how many of them are spawned while it runs.
+	"""
+	objects = ET.parse(level_path).getroot().iter("object")
+	return sum(1 for actor_object in objects if actor_object.attrib.get("name") == "Spearhead")
+
+
+def percentile(sorted_values, fraction):
+	"""
+	Returns a percentile (e.g. fraction=0.99) of a sorted list, using the nearest rank.
+	"""
+	return sorted_values[min(int(fraction*len(sorted_values)), len(sorted_values)-1)]
+
+
+def run_configuration(level_path, frames, warmup, screen_size, rendering, replay=None, batched_physics=True,
+					  culling=True, streaming=False):
+	"""
+	Loads a level headless and measures its frames.
+	The memory allocated by python is only traced while loading and during the warmup, tracing would slow down the
+	measured frames. The peak-rss covers the whole run.
+	:param replay: If given, the input recorded in this file is replayed, starting with the warmup
+	:param batched_physics: False to move every game-actor on its own, see Physics.PhysicsSystem
+	:param culling: False to spawn and update every game-actor, not only the ones around the camera
+	:param streaming: True to only keep the parts of the level around the camera in memory, see Engine
+	:return: Dict with the results
+	"""
+	# The engine must not open a window, and it has to be imported after the level was generated:
+	from Engine import Engine
+
+	tracemalloc.start()
+	start = time.perf_counter()
+	engine = Engine(screen_size, 60, headless=True, rendering=rendering, level=level_path, streaming=streaming)
+	load_time = time.perf_counter() - start
+	engine.physics.set_enabled(batched_physics)
+	engine.actors.set_culling(culling)
+	if replay:
+		engine.input.start_replay(replay)
+
+	# Let everything settle first (e.g. chunks are baked when they're visible the first time):
+	engine.step(warmup)
+	peak_traced = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	frame_times = []
+	start = time.perf_counter()
+	for frame in range(frames):
+		frame_start = time.perf_counter()
+		engine.update()
+		frame_times.append(time.perf_counter() - frame_start)
+	total_time = time.perf_counter() - start
+
+	frame_times.sort()
+	return {"actors": count_spearheads(level_path),
+			"load_time": load_time,
+			"fps": frames / total_time,
+			"frame_time_ms": {"mean": 1000. * total_time / frames,
+							  "p50": 1000. * percentile(frame_times, 0.5),
+							  "p90": 1000. * percentile(frame_times, 0.9),
+							  "p99": 1000. * percentile(frame_times, 0.99),
+							  "max": 1000. * frame_times[-1]},
+			"peak_traced_memory": peak_traced,
+			# ru_maxrss is in kilobytes on Linux, but in bytes on macOS:
+			"peak_rss": None if resource is None else
+				resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)}
+
+
+def parse_size(text):
+	width, height = text.lower().split("x")
+	return int(width), int(height)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Measures how the engine scales with level size and actor amount.")
+	parser.add_argument("--sizes", default="30x16,200x50,500x125,1000x250,2000x500",
+						help="Comma-separated level sizes in tiles (default: %(default)s)")
+	parser.add_argument("--actors", default="0,50,200,1000",
+						help="Comma-separated amounts of spearheads (default: %(default)s)")
+	parser.add_argument("--frames", type=int, default=300, help="Measured frames per configuration")
+	parser.add_argument("--warmup", type=int, default=30, help="Frames run before measuring")
+	parser.add_argument("--screen", default="480x256", help="Screen size in pixels (default: %(default)s)")
+	parser.add_argument("--no-render", action="store_true", help="Skip drawing entirely")
+	parser.add_argument("--replay", help="Run the first level with the input recorded in this file instead")
+	parser.add_argument("--no-batched-physics", action="store_true",
+						help="Move every game-actor on its own instead of using numpy")
+	parser.add_argument("--no-culling", action="store_true",
+						help="Spawn and update every game-actor, not only the ones around the camera")
+	parser.add_argument("--streaming", action="store_true", help="Stream the levels in chunks instead of holding them")
+	parser.add_argument("-o", "--output", default="benchmark.json", help="JSON-file to save the report to")
+	# Internal: Run one configuration in this process and print its result:
+	parser.add_argument("--run", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	# The engine loads its images relative to its own directory:
+	output_path = os.path.abspath(args.output)
+	replay_path = os.path.abspath(args.replay) if args.replay else None
+	os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+	if args.run:
+		print(json.dumps(run_configuration(args.run, args.frames, args.warmup, parse_size(args.screen),
+										   not args.no_render, replay_path, not args.no_batched_physics,
+										   not args.no_culling, args.streaming)))
+		return
+
+	report = {"date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+			  "python": platform.python_version(),
+			  "platform": platform.platform(),
+			  "frames": args.frames,
+			  "warmup": args.warmup,
+			  "screen": list(parse_size(args.screen)),
+			  "rendering": not args.no_render,
+			  "batched_physics": not args.no_batched_physics,
+			  "culling": not args.no_culling,
+			  "streaming": args.streaming,
+			  "replay": replay_path,
+			  "results": []}
+
+	# The replay only fits the first level:
+	if replay_path:
+		source_root = ET.parse(SOURCE_LEVEL).getroot()
+		configurations = [((int(source_root.attrib["width"]), int(source_root.attrib["height"])), None)]
+	else:
+		configurations = [(size, actor_amount) for size in map(parse_size, args.sizes.split(","))
+						  for actor_amount in map(int, args.actors.split(","))]
+
+	level_directory = tempfile.mkdtemp(prefix="wl3-benchmark-")
+	try:
+		for size, actor_amount in configurations:
+			if actor_amount is None:
+				level_path = os.path.abspath(SOURCE_LEVEL)
+			else:
+				level_path = os.path.join(level_directory, "level_%ix%i_%i.tmx" % (size + (actor_amount,)))
+				generate_level(level_path, size, actor_amount)
+
+			# Run it in its own process, so the peak memory isn't the one of another configuration:
+			command = [sys.executable, os.path.abspath(__file__), "--run", level_path, "--frames", str(args.frames),
+					   "--warmup", str(args.warmup), "--screen", args.screen]
+			if args.no_render:
+				command.append("--no-render")
+			if args.no_batched_physics:
+				command.append("--no-batched-physics")
+			if args.no_culling:
+				command.append("--no-culling")
+			if args.streaming:
+				command.append("--streaming")
+			if replay_path:
+				command += ["--replay", replay_path]
+			output = subprocess.check_output(command, universal_newlines=True)
+			result = json.loads(output.strip().splitlines()[-1])
+			result["level_size"] = list(size)
+			report["results"].append(result)
+
+			print("%4ix%-4i %5i actors: %8.1f fps, p50 %6.2f ms, p99 %6.2f ms, load %5.2f s, peak rss %6.1f MB" %
+				  (size[0], size[1], result["actors"], result["fps"], result["frame_time_ms"]["p50"],
+				   result["frame_time_ms"]["p99"], result["load_time"], (result["peak_rss"] or 0) / 2.**20))
+	finally:
+		shutil.rmtree(level_directory)
+
+	with open(output_path, "w") as report_file:
+		json.dump(report, report_file, indent=2)
+	print("Saved report to %s." % output_path)
+
+
+if __name__ == "__main__":
+	main()
@@ -1,8 +1,29 @@
 #!/usr/bin/python3
+import argparse
+
 from Engine import *
 
+parser = argparse.ArgumentParser(description="Wario Land 3 in Pygame")
+parser.add_argument("--record", metavar="FILE", help="Record the input and save it to FILE when the game ends")
+parser.add_argument("--replay", metavar="FILE", help="Replay input recorded with --record")
+parser.add_argument("--frames", type=int, help="End the game after this many frames")
+parser.add_argument("--headless", action="store_true", help="Run without a window, as fast as possible")
+args = parser.parse_args()
+
 # GBC: 160 x 144, level1: 480x256
-engine = Engine((480, 256), 60)
+engine = Engine((480, 256), 60, headless=args.headless)
+
+if args.replay:
+	engine.input.start_replay(args.replay)
+if args.record:
+	engine.input.start_recording()
 
-while True:
-	engine.update()
+try:
+	frame = 0
+	while args.frames is None or frame < args.frames:
+		engine.update()
+		frame += 1
+finally:
+	# Save the recording, even if the window was closed:
+	if args.record:
+		engine.input.stop_recording(args.record)